@@ -0,0 +1,53 @@
+"""Timings for the hot API endpoints (list, filter, paginate) with pytest-benchmark.
+
+Correctness stays in tests/test_api.py; these only time the requests against a
+database loaded from a few wx_data files through the real ingest path.
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+# In-memory SQLite; must be set before app creates its engine
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from app import app
+from ingest import ingest_weather_data
+
+STATION_FILES = ('USC00110072.txt', 'USC00110187.txt', 'USC00110338.txt')
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    wx_dir = tmp_path_factory.mktemp('wx_data')
+    for name in STATION_FILES:
+        shutil.copy(os.path.join(ROOT, 'wx_data', name), wx_dir)
+    ingest_weather_data(str(wx_dir), workers=1)
+    app.config['TESTING'] = True
+    return app.test_client()
+
+def fetch(client, url):
+    """GET url and read the whole body: fact pages stream, so the work happens while reading."""
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.get_data()
+
+def test_weather_list_bench(benchmark, client):
+    body = benchmark(fetch, client, '/api/weather/')
+    assert body.count(b'"station_id"') == 50
+
+def test_weather_filter_bench(benchmark, client):
+    body = benchmark(
+        fetch, client, '/api/weather/?station_id=USC00110072&start_date=2000-01-01&end_date=2000-12-31'
+    )
+    assert body.count(b'"station_id"') == 50
+
+def test_weather_pagination_bench(benchmark, client):
+    body = benchmark(fetch, client, '/api/weather/?page=20&per_page=100')
+    assert body.count(b'"station_id"') == 100
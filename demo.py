@@ -8,7 +8,7 @@ import os
 import sys
 import time
 import requests
-import json
+import orjson
 from datetime import datetime
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
@@ -26,29 +26,29 @@ def print_section(title):
 def test_health():
     print_section("Health Check")
     r = requests.get(f"{API_BASE}/api/health")
-    print(r.status_code, r.json())
+    print(r.status_code, orjson.loads(r.content))
 
 def test_station_list():
     print_section("Station List")
     r = requests.get(f"{API_BASE}/api/stations/")
     print(r.status_code)
-    data = r.json()
-    print(json.dumps(data['data'], indent=2))
+    data = orjson.loads(r.content)
+    print(orjson.dumps(data['data'], option=orjson.OPT_INDENT_2).decode())
 
 def test_weather_fact_list():
     print_section("WeatherFact List (all)")
     r = requests.get(f"{API_BASE}/api/weather/")
     print(r.status_code)
-    data = r.json()
+    data = orjson.loads(r.content)
     for fact in data['data']:
         print(f"{fact['station_id']} {fact['observation_date']} max_raw={fact['raw_max_temp']} max_c={fact['max_temp_c']} year={fact.get('year')}")
 
 def test_weather_fact_filtering():
     print_section("WeatherFact Filtering")
     r = requests.get(f"{API_BASE}/api/weather/?station_id=TEST001&data_quality=excellent")
-    print(r.status_code, r.json()['data'])
+    print(r.status_code, orjson.loads(r.content)['data'])
     r = requests.get(f"{API_BASE}/api/weather/?start_date=2020-01-02")
-    print(r.status_code, r.json()['data'])
+    print(r.status_code, orjson.loads(r.content)['data'])
 
 def test_check_constraint():
     print_section("Check Constraint (raw_max_temp out of bounds)")
@@ -58,8 +58,8 @@ def test_check_constraint():
 
 def test_year_column():
     print_section("Year Column Usage")
-    r = requests.get(f"{API_BASE}/api/weather/")
-    years = set(fact.get('year') for fact in r.json()['data'])
+    r = requests.get(f"{API_BASE}/api/weather/years")
+    years = orjson.loads(r.content)['years']
     print(f"Years present in facts: {years}")
 
 def main():
@@ -67,10 +67,10 @@ def create_directories():
     
     directories = ['logs', 'data']
     for directory in directories:
-        if not os.path.exists(directory):
+        try:
             os.makedirs(directory)
             print(f"✅ Created {directory}/")
-        else:
+        except FileExistsError:
             print(f"✅ {directory}/ already exists")
 
 def main():
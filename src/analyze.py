@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime, date
-from sqlalchemy import func, extract
+from sqlalchemy import func, extract, cast, literal, null, select, type_coerce, union_all, Float, Integer
 from models import create_engine_and_session, WeatherFact, Station
 
 # Configure logging
@@ -14,12 +14,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Aggregation rows are streamed from the DBAPI cursor in batches of this size instead of buffered with .all()
+AGGREGATION_BATCH_SIZE = 10_000
+
+def _month_expr(session):
+    """Month of observation_date; SQLite stores ISO date text, so substr is cheaper than strftime."""
+    if session.bind.dialect.name == 'sqlite':
+        return cast(func.substr(WeatherFact.observation_date, 6, 2), Integer)
+    return extract('month', WeatherFact.observation_date)
+
 def annual_weather_aggregation(session):
-    """Materialized view: annual stats per station using clean/generated columns."""
+    """Materialized view: annual stats per station using clean/generated columns (streamed, see AGGREGATION_BATCH_SIZE)."""
     logger.info("Calculating annual weather aggregations (materialized view style)...")
     results = session.query(
         WeatherFact.station_id,
-        extract('year', WeatherFact.observation_date).label('year'),
+        WeatherFact.year,
         func.avg(WeatherFact.max_temp_c).label('avg_max_temp_c'),
         func.avg(WeatherFact.min_temp_c).label('avg_min_temp_c'),
         func.sum(WeatherFact.precip_mm).label('total_precip_mm'),
@@ -27,18 +36,18 @@ def annual_weather_aggregation(session):
         func.avg(WeatherFact.quality_score).label('avg_quality_score')
     ).group_by(
         WeatherFact.station_id,
-        extract('year', WeatherFact.observation_date)
-    ).all()
-    logger.info(f"Annual aggregations calculated for {len(results)} station-years.")
+        WeatherFact.year
+    ).yield_per(AGGREGATION_BATCH_SIZE)
     return results
 
 def monthly_weather_aggregation(session):
-    """Materialized view: monthly stats per station using clean/generated columns."""
+    """Materialized view: monthly stats per station using clean/generated columns (streamed, see AGGREGATION_BATCH_SIZE)."""
     logger.info("Calculating monthly weather aggregations (materialized view style)...")
+    month = _month_expr(session)
     results = session.query(
         WeatherFact.station_id,
-        extract('year', WeatherFact.observation_date).label('year'),
-        extract('month', WeatherFact.observation_date).label('month'),
+        WeatherFact.year,
+        month.label('month'),
         func.avg(WeatherFact.max_temp_c).label('avg_max_temp_c'),
         func.avg(WeatherFact.min_temp_c).label('avg_min_temp_c'),
         func.sum(WeatherFact.precip_mm).label('total_precip_mm'),
@@ -46,20 +55,18 @@ def monthly_weather_aggregation(session):
         func.avg(WeatherFact.quality_score).label('avg_quality_score')
     ).group_by(
         WeatherFact.station_id,
-        extract('year', WeatherFact.observation_date),
-        extract('month', WeatherFact.observation_date)
-    ).all()
-    logger.info(f"Monthly aggregations calculated for {len(results)} station-months.")
+        WeatherFact.year,
+        month
+    ).yield_per(AGGREGATION_BATCH_SIZE)
     return results
 
 def quarterly_weather_aggregation(session):
-    """Materialized view: quarterly stats per station using clean/generated columns."""
+    """Materialized view: quarterly stats per station using clean/generated columns (streamed, see AGGREGATION_BATCH_SIZE)."""
     logger.info("Calculating quarterly weather aggregations (materialized view style)...")
-    quarter_case = func.floor((extract('month', WeatherFact.observation_date) - 1) / 3 + 1)
     results = session.query(
         WeatherFact.station_id,
-        extract('year', WeatherFact.observation_date).label('year'),
-        quarter_case.label('quarter'),
+        WeatherFact.year,
+        WeatherFact.quarter,
         func.avg(WeatherFact.max_temp_c).label('avg_max_temp_c'),
         func.avg(WeatherFact.min_temp_c).label('avg_min_temp_c'),
         func.sum(WeatherFact.precip_mm).label('total_precip_mm'),
@@ -67,25 +74,76 @@ def quarterly_weather_aggregation(session):
         func.avg(WeatherFact.quality_score).label('avg_quality_score')
     ).group_by(
         WeatherFact.station_id,
-        extract('year', WeatherFact.observation_date),
-        quarter_case
-    ).all()
-    logger.info(f"Quarterly aggregations calculated for {len(results)} station-quarters.")
+        WeatherFact.year,
+        WeatherFact.quarter
+    ).yield_per(AGGREGATION_BATCH_SIZE)
     return results
 
+def all_weather_aggregations(session):
+    """Annual, quarterly and monthly stats in one fact-table scan (streamed).
+
+    A monthly CTE keeps sums and non-null counts so the coarser periods roll up exactly;
+    rows are tagged with period_type and period (month, quarter, or NULL for annual).
+    """
+    logger.info("Calculating all weather aggregations in a single scan...")
+    month = _month_expr(session)
+    monthly = session.query(
+        WeatherFact.station_id,
+        WeatherFact.year,
+        WeatherFact.quarter,
+        month.label('month'),
+        func.sum(WeatherFact.max_temp_c).label('sum_max_temp_c'),
+        func.count(WeatherFact.max_temp_c).label('n_max_temp_c'),
+        func.sum(WeatherFact.min_temp_c).label('sum_min_temp_c'),
+        func.count(WeatherFact.min_temp_c).label('n_min_temp_c'),
+        func.sum(WeatherFact.precip_mm).label('total_precip_mm'),
+        func.count().label('record_count'),
+        func.sum(WeatherFact.quality_score).label('sum_quality_score'),
+        func.count(WeatherFact.quality_score).label('n_quality_score')
+    ).group_by(
+        WeatherFact.station_id,
+        WeatherFact.year,
+        WeatherFact.quarter,
+        month
+    ).cte('monthly')
+
+    def rollup(period_type, period, *group_by):
+        def mean(total, n):
+            return type_coerce(func.sum(monthly.c[total]) / func.nullif(func.sum(monthly.c[n]), 0), Float)
+        return select(
+            literal(period_type).label('period_type'),
+            monthly.c.station_id,
+            monthly.c.year,
+            period.label('period'),
+            mean('sum_max_temp_c', 'n_max_temp_c').label('avg_max_temp_c'),
+            mean('sum_min_temp_c', 'n_min_temp_c').label('avg_min_temp_c'),
+            func.sum(monthly.c.total_precip_mm).label('total_precip_mm'),
+            func.sum(monthly.c.record_count).label('record_count'),
+            mean('sum_quality_score', 'n_quality_score').label('avg_quality_score')
+        ).group_by(monthly.c.station_id, monthly.c.year, *group_by)
+
+    stmt = union_all(
+        rollup('annual', null()),
+        rollup('quarterly', monthly.c.quarter, monthly.c.quarter),
+        rollup('monthly', monthly.c.month, monthly.c.month)
+    )
+    return session.execute(stmt).yield_per(AGGREGATION_BATCH_SIZE)
+
 def run_all_aggregations():
-    """Run all materialized view aggregations and print sample results."""
+    """Run all materialized view aggregations (one scan) and print sample results."""
     engine, SessionLocal = create_engine_and_session()
     session = SessionLocal()
     try:
-        annual = annual_weather_aggregation(session)
-        monthly = monthly_weather_aggregation(session)
-        quarterly = quarterly_weather_aggregation(session)
-        logger.info(f"Sample annual aggregation: {annual[:1]}")
-        logger.info(f"Sample monthly aggregation: {monthly[:1]}")
-        logger.info(f"Sample quarterly aggregation: {quarterly[:1]}")
+        counts = {}
+        samples = {}
+        for row in all_weather_aggregations(session):
+            counts[row.period_type] = counts.get(row.period_type, 0) + 1
+            samples.setdefault(row.period_type, row)
+        for period_type in ('annual', 'quarterly', 'monthly'):
+            logger.info(f"{period_type.capitalize()} aggregations calculated: {counts.get(period_type, 0)} rows.")
+            logger.info(f"Sample {period_type} aggregation: {samples.get(period_type)}")
     finally:
         session.close()
 
 if __name__ == "__main__":
-    run_all_aggregations() 
\ No newline at end of file
+    run_all_aggregations()
@@ -1,20 +1,42 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, make_response, request, jsonify, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_restx import Api, Resource, fields
 from flask_cors import CORS
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, or_, bindparam, func, select, tuple_, String
 from datetime import datetime
+from functools import lru_cache
 from models import (
-    create_engine_and_session, 
-    Station, WeatherFact
+    create_engine_and_session, check_schema,
+    Station, WeatherFact, QUALITY_NAMES, QUALITY_CODES
 )
 import logging
+import time
+import orjson
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One engine (and connection pool) for the life of the process, shared by every request
+ENGINE, SessionLocal = create_engine_and_session()
+# Fail at startup, not on every request, when the database predates the current schema
+check_schema(ENGINE)
+
+# orjson is several times faster than the stdlib json module for these payloads
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider (jsonify, request.get_json) backed by orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
 # Initialize Flask-RESTX API
@@ -26,6 +48,13 @@ api = Api(
     doc='/docs'
 )
 
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    """Serialize Flask-RESTX responses with orjson instead of the stdlib json module."""
+    resp = make_response(orjson.dumps(data, option=ORJSON_OPTIONS), code)
+    resp.headers.extend(headers or {})
+    return resp
+
 # Namespaces
 station_ns = api.namespace('api/stations', description='Weather station dimension')
 fact_ns = api.namespace('api/weather', description='Weather fact table (raw + clean)')
@@ -84,15 +113,27 @@ station_response = api.model('StationResponse', {
     'pagination': fields.Nested(pagination_model)
 })
 
+fact_pagination_model = api.model('KeysetPagination', {
+    'page': fields.Integer(),
+    'per_page': fields.Integer(),
+    'has_next': fields.Boolean(),
+    'has_prev': fields.Boolean(),
+    # Cursor for the next page: pass back as after_date/after_station/after_source
+    'next_after_date': fields.Date(),
+    'next_after_station': fields.String(),
+    'next_after_source': fields.String(),
+})
+
 fact_response = api.model('WeatherFactResponse', {
     'data': fields.List(fields.Nested(fact_model)),
-    'pagination': fields.Nested(pagination_model)
+    'pagination': fields.Nested(fact_pagination_model)
 })
 
-def get_paginated_response(query, page, per_page):
-    total = query.count()
+def get_paginated_response(session, stmt, params, page, per_page, total):
     pages = (total + per_page - 1) // per_page
-    records = query.offset((page - 1) * per_page).limit(per_page).all()
+    records = session.execute(
+        stmt, {**params, 'offset': (page - 1) * per_page, 'limit': per_page}
+    ).scalars().all()
     return {
         'data': records,
         'pagination': {
@@ -105,6 +146,145 @@ def get_paginated_response(query, page, per_page):
         }
     }
 
+# Filter clauses by request parameter. List statements are built once per combination of
+# present filters and then reused with fresh bind values, so repeated request shapes skip
+# query construction and go straight to SQLAlchemy's compiled-statement cache.
+# Dates arrive as YYYY-MM-DD strings and are bound as such.
+STATION_FILTERS = {
+    'state': lambda: Station.state == bindparam('state'),
+    'active': lambda: Station.active == bindparam('active'),
+    'country': lambda: Station.country == bindparam('country'),
+}
+
+FACT_FILTERS = {
+    'station_id': lambda: WeatherFact.station_id == bindparam('station_id'),
+    'start_date': lambda: WeatherFact.observation_date >= bindparam('start_date', type_=String),
+    'end_date': lambda: WeatherFact.observation_date <= bindparam('end_date', type_=String),
+    'source': lambda: WeatherFact.source == bindparam('source'),
+    'data_quality': lambda: WeatherFact.data_quality == bindparam('data_quality'),
+    # Seek past the cursor in (observation_date DESC, station_id, source) order; the leading
+    # range on observation_date lets idx_fact_keyset start at the cursor instead of scanning
+    'after_date': lambda: and_(
+        WeatherFact.observation_date <= bindparam('after_date', type_=String),
+        or_(
+            WeatherFact.observation_date < bindparam('after_date', type_=String),
+            tuple_(WeatherFact.station_id, WeatherFact.source)
+            > tuple_(bindparam('after_station'), bindparam('after_source'))
+        )
+    ),
+    # Cursor without a source: continue past every source of after_station on after_date
+    'after_station': lambda: and_(
+        WeatherFact.observation_date <= bindparam('after_date', type_=String),
+        or_(
+            WeatherFact.observation_date < bindparam('after_date', type_=String),
+            WeatherFact.station_id > bindparam('after_station')
+        )
+    ),
+}
+
+_statement_cache = {}
+
+def cached_statement(kind, present):
+    """Return the select for `kind` ('stations', 'station_count' or 'facts') filtered on `present`."""
+    key = (kind, present)
+    stmt = _statement_cache.get(key)
+    if stmt is None:
+        if kind == 'facts':
+            stmt = select(WeatherFact).where(*(FACT_FILTERS[name]() for name in present)).order_by(
+                WeatherFact.observation_date.desc(), WeatherFact.station_id, WeatherFact.source
+            )
+        else:
+            where = [STATION_FILTERS[name]() for name in present]
+            if kind == 'station_count':
+                stmt = select(func.count()).select_from(Station).where(*where)
+            else:
+                stmt = select(Station).where(*where).order_by(Station.station_id)
+        if kind != 'station_count':
+            stmt = stmt.offset(bindparam('offset')).limit(bindparam('limit'))
+        _statement_cache[key] = stmt
+    return stmt
+
+def fact_to_dict(r):
+    return {
+        'station_id': r.station_id,
+        'observation_date': r.observation_date.isoformat(),
+        'source': r.source,
+        'raw_max_temp': r.raw_max_temp,
+        'raw_min_temp': r.raw_min_temp,
+        'raw_precip': r.raw_precip,
+        'max_temp_c': r.max_temp_c,
+        'min_temp_c': r.min_temp_c,
+        'precip_mm': r.precip_mm,
+        'precip_cm': r.precip_cm,
+        'data_quality': QUALITY_NAMES[r.data_quality] if r.data_quality is not None else None,
+        'quality_score': float(r.quality_score) if r.quality_score else None,
+        'missing_values': r.missing_values,
+        'outlier_count': r.outlier_count,
+        'quality_notes': f"Missing: {r.missing_values}, Outliers: {r.outlier_count}",
+        'ingested_at': r.ingested_at.isoformat() if r.ingested_at else None,
+        'ingest_run_id': r.ingest_run_id,
+        'year': getattr(r, 'year', r.observation_date.year if r.observation_date else None)
+    }
+
+def fetch_keyset_page(session, stmt, params, page, per_page):
+    """Rows for one page plus one extra row that tells has_next, so no COUNT(*) scan is needed.
+
+    The page is fetched whole before the response starts, so a database error is still a 500.
+    """
+    return session.execute(
+        stmt, {**params, 'offset': (page - 1) * per_page, 'limit': per_page + 1}
+    ).scalars().all()
+
+def stream_keyset_response(rows, page, per_page, has_cursor=False):
+    """Yield the JSON page for rows from fetch_keyset_page, one record at a time."""
+    yield b'{"data":['
+    page_rows = rows[:per_page]
+    for i, r in enumerate(page_rows):
+        if i:
+            yield b','
+        yield orjson.dumps(fact_to_dict(r))
+    has_next = len(rows) > per_page
+    # The cursor is the last row sent; there is none on an empty page
+    cursor = page_rows[-1] if has_next and page_rows else None
+    pagination = {
+        'page': page,
+        'per_page': per_page,
+        'has_next': has_next,
+        'has_prev': has_cursor or page > 1,
+        'next_after_date': cursor.observation_date.isoformat() if cursor is not None else None,
+        'next_after_station': cursor.station_id if cursor is not None else None,
+        'next_after_source': cursor.source if cursor is not None else None
+    }
+    yield b'],"pagination":' + orjson.dumps(pagination) + b'}'
+
+def station_params(state=None, active=None, country=None):
+    """Bind values for the station filters that are present, keyed by parameter name."""
+    params = {}
+    if state:
+        params['state'] = state
+    if active is not None:
+        params['active'] = active.lower() == 'true'
+    if country:
+        params['country'] = country
+    return params
+
+# Seconds a cached station total may be served; ingest runs in another process and cannot clear it
+STATION_COUNT_TTL = 60
+
+def station_count_bucket():
+    """Current STATION_COUNT_TTL time bucket: part of the count_stations cache key, so entries expire."""
+    return int(time.monotonic() // STATION_COUNT_TTL)
+
+@lru_cache(maxsize=128)
+def count_stations(state=None, active=None, country=None, bucket=None):
+    """Station totals per filter combination, cached per `bucket` (see station_count_bucket)."""
+    session = SessionLocal()
+    try:
+        params = station_params(state, active, country)
+        return session.execute(cached_statement('station_count', tuple(params)), params).scalar_one()
+    finally:
+        session.close()
+
 @station_ns.route('/')
 class StationList(Resource):
     @station_ns.doc('get_stations', params={
@@ -117,25 +297,19 @@ class StationList(Resource):
     @station_ns.marshal_with(station_response)
     def get(self):
         page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 50, type=int), 1000)
+        per_page = max(1, min(request.args.get('per_page', 50, type=int), 1000))
         state = request.args.get('state')
         active = request.args.get('active')
         country = request.args.get('country')
         if page < 1:
             page = 1
-        engine, SessionLocal = create_engine_and_session()
         session = SessionLocal()
         try:
-            query = session.query(Station)
-            if state:
-                query = query.filter(Station.state == state)
-            if active is not None:
-                active_bool = active.lower() == 'true'
-                query = query.filter(Station.active == active_bool)
-            if country:
-                query = query.filter(Station.country == country)
-            query = query.order_by(Station.station_id)
-            response = get_paginated_response(query, page, per_page)
+            params = station_params(state, active, country)
+            total = count_stations(state, active, country, station_count_bucket())
+            response = get_paginated_response(
+                session, cached_statement('stations', tuple(params)), params, page, per_page, total
+            )
             response['data'] = [
                 {
                     'station_id': r.station_id,
@@ -159,65 +333,76 @@ class StationList(Resource):
 @fact_ns.route('/')
 class WeatherFactList(Resource):
     @fact_ns.doc('get_weather_facts', params={
-        'page': 'Page number (default: 1)',
+        'page': 'Page number (default: 1); prefer the after_* cursor for deep pages',
         'per_page': 'Records per page (default: 50, max: 1000)',
+        'after_date': 'Keyset cursor: next_after_date from the previous page',
+        'after_station': 'Keyset cursor: next_after_station from the previous page',
+        'after_source': 'Keyset cursor: next_after_source from the previous page (optional)',
         'station_id': 'Filter by station ID',
         'start_date': 'Start date (YYYY-MM-DD)',
         'end_date': 'End date (YYYY-MM-DD)',
         'source': 'Filter by source',
-        'data_quality': 'Filter by data quality',
+        'data_quality': 'Filter by data quality (poor, fair, good, excellent)',
     })
-    @fact_ns.marshal_with(fact_response)
+    @fact_ns.response(200, 'Success', fact_response)
+    @fact_ns.response(400, 'Incomplete keyset cursor')
     def get(self):
         page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 50, type=int), 1000)
+        per_page = max(1, min(request.args.get('per_page', 50, type=int), 1000))
         station_id = request.args.get('station_id')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         source = request.args.get('source')
         data_quality = request.args.get('data_quality')
-        if page < 1:
+        after_date = request.args.get('after_date')
+        after_station = request.args.get('after_station')
+        after_source = request.args.get('after_source')
+        has_cursor = bool(after_date and after_station)
+        if not has_cursor and (after_date or after_station or after_source):
+            fact_ns.abort(400, 'after_date and after_station must be given together')
+        if page < 1 or has_cursor:
             page = 1
-        engine, SessionLocal = create_engine_and_session()
+        params = {
+            name: value for name, value in (
+                ('station_id', station_id),
+                ('start_date', start_date),
+                ('end_date', end_date),
+                ('source', source),
+                ('data_quality', data_quality),
+            ) if value
+        }
+        if data_quality:
+            # The column stores codes; an unknown name binds NULL and matches nothing, as before
+            params['data_quality'] = QUALITY_CODES.get(data_quality)
+        filters = tuple(params)
+        if has_cursor:
+            params.update(after_date=after_date, after_station=after_station)
+            if after_source:
+                filters += ('after_date',)
+                params['after_source'] = after_source
+            else:
+                filters += ('after_station',)
+        stmt = cached_statement('facts', filters)
         session = SessionLocal()
         try:
-            query = session.query(WeatherFact)
-            if station_id:
-                query = query.filter(WeatherFact.station_id == station_id)
-            if start_date:
-                query = query.filter(WeatherFact.observation_date >= start_date)
-            if end_date:
-                query = query.filter(WeatherFact.observation_date <= end_date)
-            if source:
-                query = query.filter(WeatherFact.source == source)
-            if data_quality:
-                query = query.filter(WeatherFact.data_quality == data_quality)
-            query = query.order_by(WeatherFact.observation_date.desc(), WeatherFact.station_id)
-            response = get_paginated_response(query, page, per_page)
-            response['data'] = [
-                {
-                    'station_id': r.station_id,
-                    'observation_date': r.observation_date.isoformat(),
-                    'source': r.source,
-                    'raw_max_temp': r.raw_max_temp,
-                    'raw_min_temp': r.raw_min_temp,
-                    'raw_precip': r.raw_precip,
-                    'max_temp_c': r.max_temp_c,
-                    'min_temp_c': r.min_temp_c,
-                    'precip_mm': r.precip_mm,
-                    'precip_cm': r.precip_cm,
-                    'data_quality': r.data_quality,
-                    'quality_score': float(r.quality_score) if r.quality_score else None,
-                    'missing_values': r.missing_values,
-                    'outlier_count': r.outlier_count,
-                    'quality_notes': r.quality_notes,
-                    'ingested_at': r.ingested_at.isoformat() if r.ingested_at else None,
-                    'ingest_run_id': r.ingest_run_id,
-                    'year': getattr(r, 'year', r.observation_date.year if r.observation_date else None)
-                }
-                for r in response['data']
-            ]
-            return response
+            rows = fetch_keyset_page(session, stmt, params, page, per_page)
+        finally:
+            session.close()
+        # Stream the serialized page instead of building (and re-marshalling) a list of dicts
+        return Response(
+            stream_with_context(stream_keyset_response(rows, page, per_page, has_cursor=has_cursor)),
+            mimetype='application/json'
+        )
+
+@fact_ns.route('/years')
+class WeatherFactYears(Resource):
+    @fact_ns.doc('get_weather_years')
+    def get(self):
+        """Distinct observation years, computed server-side from the generated year column."""
+        session = SessionLocal()
+        try:
+            years = session.query(WeatherFact.year).distinct().order_by(WeatherFact.year).all()
+            return {'years': [year for (year,) in years]}
         finally:
             session.close()
 
@@ -229,9 +414,8 @@ class HealthCheck(Resource):
 
 if __name__ == '__main__':
     # Create tables if they don't exist
-    engine, _ = create_engine_and_session()
     from models import create_tables
-    create_tables(engine)
+    create_tables(ENGINE)
     
     # Run the Flask app
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
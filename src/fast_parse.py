@@ -0,0 +1,139 @@
+"""
+Compiled parser for the wx_data station files.
+
+Each line is ``YYYYMMDD<TAB>max_temp<TAB>min_temp<TAB>precip`` with values in tenths
+and -9999 for a missing measurement. parse_weather_bytes scans the raw file bytes in
+one pass and returns plain integer arrays, plus the offsets of the lines it rejected so the
+caller can report them; no Python objects are created per line.
+Numba is optional: without it, parse_weather_text gives the same arrays via pandas' C CSV reader.
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+MISSING = -9999
+
+_NEWLINE = 10
+_TAB = 9
+_SPACE = 32
+_CR = 13
+_PLUS = 43
+_MINUS = 45
+_ZERO = 48
+_NINE = 57
+
+@njit(cache=True)
+def parse_weather_bytes(buf):
+    """Parse a uint8 buffer into (dates, max_temp, min_temp, precip, rejected) arrays.
+
+    Dates are encoded as YYYYMMDD integers. Fields follow int(): an optional sign, digits,
+    and surrounding spaces. Lines that do not have exactly four such tab-separated fields
+    are skipped, and the byte offset where each one starts is returned in `rejected`.
+    """
+    size = buf.shape[0]
+    n_lines = 1
+    for i in range(size):
+        if buf[i] == _NEWLINE:
+            n_lines += 1
+    dates = np.empty(n_lines, np.int32)
+    max_temp = np.empty(n_lines, np.int32)
+    min_temp = np.empty(n_lines, np.int32)
+    precip = np.empty(n_lines, np.int32)
+    rejected = np.empty(n_lines, np.int64)
+    fields = np.empty(4, np.int32)
+
+    n = 0
+    n_rejected = 0
+    i = 0
+    while i < size:
+        line_start = i
+        field = 0
+        value = 0
+        negative = False
+        signed = False
+        digits = 0
+        ended = False  # whitespace after the number: only more whitespace may follow
+        valid = True
+        blank = True
+        while i < size and buf[i] != _NEWLINE:
+            c = int(buf[i])
+            if _ZERO <= c <= _NINE:
+                if ended:
+                    valid = False
+                value = value * 10 + (c - _ZERO)
+                digits += 1
+                blank = False
+            elif c == _TAB:
+                if field >= 3 or digits == 0:
+                    valid = False
+                else:
+                    fields[field] = -value if negative else value
+                    field += 1
+                value = 0
+                negative = False
+                signed = False
+                digits = 0
+                ended = False
+                blank = False
+            elif (c == _MINUS or c == _PLUS) and digits == 0 and not signed and not ended:
+                negative = c == _MINUS
+                signed = True
+                blank = False
+            elif c == _SPACE or c == _CR:
+                if digits > 0 or signed:
+                    ended = True
+            else:
+                valid = False
+                blank = False
+            i += 1
+        i += 1  # skip the newline
+
+        if blank:
+            continue
+        if valid and field == 3 and digits > 0:
+            fields[3] = -value if negative else value
+            dates[n] = fields[0]
+            max_temp[n] = fields[1]
+            min_temp[n] = fields[2]
+            precip[n] = fields[3]
+            n += 1
+        else:
+            rejected[n_rejected] = line_start
+            n_rejected += 1
+
+    return dates[:n], max_temp[:n], min_temp[:n], precip[:n], rejected[:n_rejected]
+
+def parse_weather_text(buf):
+    """pandas fallback for parse_weather_bytes when Numba is not installed (same output).
+
+    Raises ValueError on malformed lines; callers then fall back to line-by-line parsing.
+    """
+    df = pd.read_csv(io.BytesIO(buf), sep='\t', header=None, dtype=np.int32, engine='c')
+    if df.shape[1] != 4:
+        raise ValueError(f"expected 4 columns, found {df.shape[1]}")
+    return tuple(df[column].to_numpy() for column in range(4))
+
+def decode_dates(dates):
+    """Turn YYYYMMDD integers into a datetime64[D] array plus a mask of the valid ones.
+
+    Pure array arithmetic: no strptime and no per-element date() calls. Impossible dates
+    (month 13, Feb 30, ...) are flagged by checking the day did not roll into the next month.
+    """
+    year = dates // 10000
+    month = dates // 100 % 100
+    day = dates % 100
+    months = ((year - 1970) * 12 + (month - 1)).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1)
+    valid = (month >= 1) & (month <= 12) & (day >= 1) & (days.astype('datetime64[M]') == months)
+    return days, valid
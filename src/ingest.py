@@ -1,26 +1,74 @@
 import os
+import csv
+import io
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import mmap
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from itertools import islice
 from datetime import datetime, date
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import func
+from sqlalchemy import delete, func, insert, select, text, update
 from sqlalchemy.dialects.sqlite import insert as sqlite_upsert
 from sqlalchemy.dialects.postgresql import insert as pg_upsert
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError
+import numpy as np
+from fast_parse import HAVE_NUMBA, MISSING, decode_dates, parse_weather_bytes, parse_weather_text
 from models import (
     create_engine_and_session, create_tables, 
-    Station, WeatherFact
+    Station, WeatherFact, IngestStats, QUALITY_NAMES
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('ingestion.log'),
-        logging.StreamHandler()
-    ]
-)
+# Logging is configured by ingest_logging() for the duration of a run, not at import
+LOG_PATH = 'ingestion.log'
 logger = logging.getLogger(__name__)
+_log_queue = None  # set while ingest_logging() is active
+
+@contextmanager
+def ingest_logging():
+    """Send this module's log records to ingestion.log and the console while the block runs.
+
+    Records go through a queue and a listener thread does the file/console I/O, keeping it off
+    the ingest loop; parse workers put theirs on the same (multiprocessing) queue. Nested uses
+    share the outer listener. Also usable as a decorator.
+    """
+    global _log_queue
+    if _log_queue is not None:
+        yield _log_queue
+        return
+    queue = multiprocessing.Queue(-1)
+    handlers = [logging.FileHandler(LOG_PATH), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    queue_handler = QueueHandler(queue)
+    saved_level, saved_propagate = logger.level, logger.propagate
+    logger.addHandler(queue_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener.start()
+    _log_queue = queue
+    try:
+        yield queue
+    finally:
+        _log_queue = None
+        logger.removeHandler(queue_handler)
+        logger.setLevel(saved_level)
+        logger.propagate = saved_propagate
+        listener.stop()
+        for handler in handlers:
+            handler.close()
+        queue.close()
+        queue.join_thread()
+
+def _init_worker_logging(queue):
+    """Parse-worker initializer: log onto the parent's queue (replacing any handler copied by fork)."""
+    logger.handlers = [QueueHandler(queue)]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
 
 # Station metadata mapping (in a real scenario, this would come from a separate file or API)
 STATION_METADATA = {
@@ -36,25 +84,36 @@ STATION_METADATA = {
     'USC00113335': {'name': 'Cincinnati Northern Kentucky International Airport', 'latitude': 39.0500, 'longitude': -84.6667, 'state': 'OH', 'elevation': 273.0},
 }
 
+# Sentinel used in the raw files for a missing measurement
+MISSING_VALUE = b'-9999'
+
+# data_quality buckets: a score >= QUALITY_THRESHOLDS[i] earns at least code i + 1 (see QUALITY_NAMES)
+QUALITY_THRESHOLDS = np.array([0.5, 0.7, 0.9])
+
+# Rows per upsert batch (one executemany and one SAVEPOINT each), across file boundaries
+BATCH_ROWS = 10_000
+
 # Example: Ingest run ID for lineage (could be a UUID)
 DEFAULT_INGEST_RUN_ID = 'default-run-001'
 
+def list_weather_files(wx_data_dir):
+    """Station files in `wx_data_dir` as DirEntry objects (one scandir; is_file/stat come cached)."""
+    with os.scandir(wx_data_dir) as entries:
+        return [entry for entry in entries if entry.name.endswith('.txt') and entry.is_file()]
+
+def existing_station_ids(session):
+    """All station_ids already in the dimension table, fetched in one query."""
+    return set(session.execute(select(Station.station_id)).scalars())
+
 def create_stations_from_files(wx_data_dir, session):
     """Create station records from weather data files."""
     logger.info("Creating station records...")
     
-    weather_files = [f for f in os.listdir(wx_data_dir) if f.endswith('.txt')]
-    stations_created = 0
+    wanted = {entry.name[:-4] for entry in list_weather_files(wx_data_dir)}
+    missing = sorted(wanted - existing_station_ids(session))
+    new_stations = []
     
-    for filename in weather_files:
-        station_id = filename.replace('.txt', '')
-        
-        # Check if station already exists
-        existing_station = session.query(Station).filter_by(station_id=station_id).first()
-        if existing_station:
-            logger.debug(f"Station {station_id} already exists")
-            continue
-        
+    for station_id in missing:
         # Get metadata for this station
         metadata = STATION_METADATA.get(station_id, {
             'name': f'Weather Station {station_id}',
@@ -75,191 +134,413 @@ def create_stations_from_files(wx_data_dir, session):
             if not metadata['state'] or len(metadata['state']) != 2:
                 raise ValueError("Invalid state code")
             
-            # Create station record
-            station = Station(
-                station_id=station_id,
-                name=metadata['name'],
-                latitude=metadata['latitude'],
-                longitude=metadata['longitude'],
-                elevation=metadata['elevation'],
-                state=metadata['state'],
-                country='USA',
-                timezone='UTC',
-                active=True
-            )
-            
-            session.add(station)
-            stations_created += 1
+            new_stations.append({
+                'station_id': station_id,
+                'name': metadata['name'],
+                'latitude': metadata['latitude'],
+                'longitude': metadata['longitude'],
+                'elevation': metadata['elevation'],
+                'state': metadata['state'],
+                'country': 'USA',
+                'timezone': 'UTC',
+                'active': True
+            })
             logger.debug(f"Created station: {station_id} - {metadata['name']}")
             
         except ValueError as e:
             logger.warning(f"Invalid station data for {station_id}: {e}")
             continue
     
+    # All new stations in one executemany
+    if new_stations:
+        session.execute(insert(Station), new_stations)
     session.commit()
-    logger.info(f"Created {stations_created} new station records")
-    return stations_created
+    logger.info(f"Created {len(new_stations)} new station records")
+    return len(new_stations)
+
+@lru_cache(maxsize=1 << 16)
+def parse_observation_date(date_str):
+    """YYYYMMDD bytes -> date. Cached: every station file repeats the same calendar days."""
+    # Fixed-width YYYYMMDD: slicing is much cheaper than strptime
+    return date(int(date_str[0:4]), int(date_str[4:6]), int(date_str[6:8]))
 
 def parse_weather_line(line):
-    """Parse a single line from weather data file (raw tenths, clean values)."""
+    """Parse a single line (bytes) into an (observation_date, raw_max_temp, raw_min_temp, raw_precip) tuple.
+
+    Raw values stay in tenths; missing measurements become None.
+    """
     try:
-        parts = line.strip().split('\t')
+        parts = line.strip().split(b'\t')
         if len(parts) != 4:
-            return None
+            raise ValueError(f"expected 4 fields, found {len(parts)}")
         date_str, max_temp_str, min_temp_str, precip_str = parts
-        observation_date = datetime.strptime(date_str, '%Y%m%d').date()
+        observation_date = parse_observation_date(date_str)
         # Raw values (tenths)
-        raw_max_temp = int(max_temp_str) if max_temp_str != '-9999' else None
-        raw_min_temp = int(min_temp_str) if min_temp_str != '-9999' else None
-        raw_precip = int(precip_str) if precip_str != '-9999' else None
-        # Clean/generated
-        max_temp_c = raw_max_temp / 10.0 if raw_max_temp is not None else None
-        min_temp_c = raw_min_temp / 10.0 if raw_min_temp is not None else None
-        precip_mm = raw_precip / 10.0 if raw_precip is not None else None
-        precip_cm = precip_mm / 10.0 if precip_mm is not None else None
-        return {
+        raw_max_temp = int(max_temp_str) if max_temp_str != MISSING_VALUE else None
+        raw_min_temp = int(min_temp_str) if min_temp_str != MISSING_VALUE else None
+        raw_precip = int(precip_str) if precip_str != MISSING_VALUE else None
+        return observation_date, raw_max_temp, raw_min_temp, raw_precip
+    except ValueError as e:
+        logger.warning(f"Failed to parse line: {line.strip().decode(errors='replace')}, error: {e}")
+        return None
+
+def _smallint(values):
+    """Pack a raw (tenths) column as int16 to match the SMALLINT columns, when every value fits."""
+    if len(values) and (values.min() < np.iinfo(np.int16).min or values.max() > np.iinfo(np.int16).max):
+        return values
+    return values.astype(np.int16)
+
+def parse_weather_lines(lines):
+    """Line-by-line fallback for parse_weather_buffer, with the same return shape."""
+    parsed_rows = [parsed for parsed in map(parse_weather_line, lines) if parsed is not None]
+    observation_dates = np.array([parsed[0] for parsed in parsed_rows], dtype='datetime64[D]')
+    raw_columns = [
+        _smallint(np.array([MISSING if value is None else value for value in column], dtype=np.int32))
+        for column in zip(*(parsed[1:] for parsed in parsed_rows))
+    ] or [np.empty(0, dtype=np.int16)] * 3
+    return (observation_dates, *raw_columns)
+
+def parse_weather_buffer(buf):
+    """Parse a whole file buffer with the compiled (or pandas) parser.
+
+    Returns (observation_dates, raw_max_temp, raw_min_temp, raw_precip): a datetime64[D]
+    array and int16 arrays in tenths, with MISSING marking a missing measurement.
+    Rejected lines and impossible dates are logged, as parse_weather_line does.
+    """
+    if HAVE_NUMBA:
+        dates, max_temps, min_temps, precips, rejected = parse_weather_bytes(np.frombuffer(buf, dtype=np.uint8))
+        for offset in rejected.tolist():
+            end = buf.find(b'\n', offset)
+            line = buf[offset:end if end != -1 else len(buf)]
+            logger.warning(f"Failed to parse line: {line.strip().decode(errors='replace')}")
+    else:
+        dates, max_temps, min_temps, precips = parse_weather_text(buf)
+    days, valid = decode_dates(dates)
+    if not valid.all():
+        for d in dates[~valid].tolist():
+            logger.warning(f"Failed to parse date: {d}")
+        days, max_temps, min_temps, precips = days[valid], max_temps[valid], min_temps[valid], precips[valid]
+    return days, _smallint(max_temps), _smallint(min_temps), _smallint(precips)
+
+def _to_celsius(raw):
+    """Clean value (raw tenths / 10) with NaN for a missing measurement."""
+    return np.where(raw == MISSING, np.nan, raw / 10.0)
+
+def score_weather_values(raw_max_temp, raw_min_temp, raw_precip):
+    """Quality-score every row of one file's raw (tenths) columns at once.
+
+    Returns a dict of equal-length arrays: missing_values, outlier_count, quality_score
+    and data_quality (codes into QUALITY_NAMES).
+    """
+    max_temp_c = _to_celsius(raw_max_temp)
+    min_temp_c = _to_celsius(raw_min_temp)
+    precip_mm = _to_celsius(raw_precip)
+
+    # Calculate data quality metrics (comparisons against NaN are False, so missing values never count as outliers)
+    missing_values = np.isnan(max_temp_c).astype(np.int8) + np.isnan(min_temp_c) + np.isnan(precip_mm)
+    outlier_count = (
+        ((max_temp_c > 50) | (max_temp_c < -50)).astype(np.int8)
+        + ((min_temp_c > 40) | (min_temp_c < -60))
+        + (precip_mm > 1000)
+    )
+    quality_score = np.maximum(0.0, 1.0 - (missing_values * 0.2) - (outlier_count * 0.1))
+    # Logical inconsistency: max below min
+    quality_score = np.where(max_temp_c < min_temp_c, np.maximum(0.0, quality_score - 0.3), quality_score)
+    # Bucket lookup instead of a comparison chain: the number of thresholds a score reaches is its code
+    data_quality = np.searchsorted(QUALITY_THRESHOLDS, quality_score, side='right').astype(np.int8)
+    return {
+        'missing_values': missing_values, 'outlier_count': outlier_count,
+        'quality_score': quality_score, 'data_quality': data_quality
+    }
+
+def _nullable(values, missing):
+    """Column as a list of Python values, None where `missing` is set."""
+    values = values.astype(object)
+    values[missing] = None
+    return values.tolist()
+
+def concat_columns(*parts):
+    """Join per-file column dicts (as returned by parse_weather_file) into one."""
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+def slice_columns(columns, start, stop=None):
+    return {name: values[start:stop] for name, values in columns.items()}
+
+def fact_rows(columns, source, ingest_run_id, ingested_at):
+    """Materialize fact rows (dicts for the executemany upsert) from a block of columns.
+
+    Done per write batch only, so parsed data waits in compact NumPy columns rather than
+    as Python objects. Every row shares the run's single `ingested_at` timestamp.
+    """
+    raw_max_temp, raw_min_temp, raw_precip = columns['raw_max_temp'], columns['raw_min_temp'], columns['raw_precip']
+    max_missing, min_missing, precip_missing = raw_max_temp == MISSING, raw_min_temp == MISSING, raw_precip == MISSING
+    values = zip(
+        columns['station_id'].tolist(),
+        # datetime64[D] -> datetime.date objects in one C-level conversion
+        columns['observation_date'].astype(object).tolist(),
+        _nullable(raw_max_temp, max_missing),
+        _nullable(raw_min_temp, min_missing),
+        _nullable(raw_precip, precip_missing),
+        _nullable(raw_max_temp / 10.0, max_missing),
+        _nullable(raw_min_temp / 10.0, min_missing),
+        _nullable(raw_precip / 10.0, precip_missing),
+        columns['data_quality'].tolist(),
+        columns['quality_score'].tolist(),
+        columns['missing_values'].tolist(),
+        columns['outlier_count'].tolist()
+    )
+    return [
+        {
+            'station_id': station_id,
             'observation_date': observation_date,
-            'raw_max_temp': raw_max_temp,
-            'raw_min_temp': raw_min_temp,
-            'raw_precip': raw_precip,
+            'source': source,
+            'raw_max_temp': raw_max,
+            'raw_min_temp': raw_min,
+            'raw_precip': raw_pr,
             'max_temp_c': max_temp_c,
             'min_temp_c': min_temp_c,
-            'precip_mm': precip_mm,
-            'precip_cm': precip_cm
+            'precip_mm': precip,
+            'data_quality': data_quality,
+            'quality_score': quality_score,
+            'missing_values': missing_values,
+            'outlier_count': outlier_count,
+            'ingested_at': ingested_at,
+            'ingest_run_id': ingest_run_id
         }
-    except Exception as e:
-        logger.warning(f"Failed to parse line: {line.strip()}, error: {e}")
-        return None
+        for (station_id, observation_date, raw_max, raw_min, raw_pr, max_temp_c, min_temp_c, precip,
+             data_quality, quality_score, missing_values, outlier_count) in values
+    ]
 
+UPSERT_KEY = ('station_id', 'observation_date', 'source')
 
+@lru_cache(maxsize=None)
+def upsert_statement(dialect, columns):
+    """ON CONFLICT upsert for `dialect` updating `columns`, built once and reused for every batch."""
+    upsert = {'sqlite': sqlite_upsert, 'postgresql': pg_upsert}[dialect]
+    stmt = upsert(WeatherFact.__table__)
+    return stmt.on_conflict_do_update(
+        index_elements=list(UPSERT_KEY),
+        set_={col: stmt.excluded[col] for col in columns if col not in UPSERT_KEY}
+    )
 
-def upsert_weather_fact(session, fact_data):
-    """Upsert (insert or update) a weather fact row for idempotency."""
-    # Use SQLAlchemy's upsert for SQLite or Postgres
+def _on_conflict_upsert(dialect, conn, rows):
+    """INSERT ... ON CONFLICT DO UPDATE for SQLite/PostgreSQL: one executemany per batch."""
+    if rows:
+        conn.execute(upsert_statement(dialect, tuple(rows[0])), rows)
+
+def _savepoint_upsert(conn, rows):
+    """Fallback for other dialects: try/except for IntegrityError, row by row inside a savepoint."""
     table = WeatherFact.__table__
-    dialect = session.bind.dialect.name
-    if dialect == 'sqlite':
-        upsert_stmt = sqlite_upsert(table).values(**fact_data)
-        upsert_stmt = upsert_stmt.on_conflict_do_update(
-            index_elements=['station_id', 'observation_date', 'source'],
-            set_=fact_data
-        )
-    elif dialect == 'postgresql':
-        upsert_stmt = pg_upsert(table).values(**fact_data)
-        upsert_stmt = upsert_stmt.on_conflict_do_update(
-            index_elements=['station_id', 'observation_date', 'source'],
-            set_=fact_data
-        )
-    else:
-        # Fallback: try/except for IntegrityError
+    for fact_data in rows:
         try:
-            session.add(WeatherFact(**fact_data))
-            session.commit()
-            return
+            with conn.begin_nested():
+                conn.execute(insert(table), fact_data)
         except IntegrityError:
-            session.rollback()
-            session.query(WeatherFact).filter_by(
-                station_id=fact_data['station_id'],
-                observation_date=fact_data['observation_date'],
-                source=fact_data['source']
-            ).update(fact_data)
-            session.commit()
-            return
-    session.execute(upsert_stmt)
-    session.commit()
+            conn.execute(
+                update(table).where(*(table.c[col] == fact_data[col] for col in UPSERT_KEY)),
+                fact_data
+            )
+
+def upsert_writer(dialect):
+    """Batch upsert function for `dialect`, picked once per run rather than on every batch."""
+    if dialect in ('sqlite', 'postgresql'):
+        return partial(_on_conflict_upsert, dialect)
+    return _savepoint_upsert
+
+def upsert_weather_fact(conn, rows):
+    """Upsert (insert or update) a batch of weather fact rows for idempotency.
+
+    `conn` is a Core Connection. Committing is left to the caller.
+    """
+    upsert_writer(conn.dialect.name)(conn, rows)
+
+def copy_weather_fact(conn, rows):
+    """Bulk-load a batch with PostgreSQL COPY FROM STDIN (first loads only: no conflict handling).
+
+    Runs on `conn`'s own DBAPI connection, so it shares the caller's transaction. Driver errors
+    are wrapped like SQLAlchemy's own (IntegrityError, DataError, ...) for write_checkpointed.
+    """
+    if not rows:
+        return
+    columns = list(rows[0])
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        # Unquoted empty fields load as NULL in CSV mode
+        writer.writerow(['' if row[col] is None else row[col] for col in columns])
+    buf.seek(0)
+    statement = f"COPY {WeatherFact.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(statement, buf)
+    except conn.dialect.dbapi.Error as e:
+        raise DBAPIError.instance(statement, None, e, conn.dialect.dbapi.Error, dialect=conn.dialect) from e
+    finally:
+        cursor.close()
+
+def write_checkpointed(conn, write_batch, rows):
+    """Write one batch inside a SAVEPOINT and return how many rows landed.
+
+    If the batch is rejected, only it is rolled back; its rows are then retried one per
+    savepoint so the bad ones can be logged and skipped without redoing the run.
+    """
+    try:
+        with conn.begin_nested():
+            write_batch(conn, rows)
+        return len(rows)
+    except (IntegrityError, DataError) as e:
+        logger.warning(f"Batch of {len(rows)} rows rejected, retrying row by row: {e.orig}")
+    written = 0
+    for row in rows:
+        try:
+            with conn.begin_nested():
+                write_batch(conn, [row])
+            written += 1
+        except (IntegrityError, DataError) as e:
+            logger.warning(f"Skipping row {row['station_id']} {row['observation_date']}: {e.orig}")
+    return written
 
-def ingest_weather_data(wx_data_dir='wx_data', source='manual', ingest_run_id=DEFAULT_INGEST_RUN_ID):
-    """Idempotent ingestion of weather data into WeatherFact (composite PK, upsert)."""
+def refresh_ingest_stats(conn):
+    """Recompute the IngestStats rollup with one GROUP BY inside the database.
+
+    Counted after the run rather than tallied per batch: reruns upsert existing rows,
+    so only the table itself knows the current per-quality totals.
+    """
+    conn.execute(delete(IngestStats))
+    conn.execute(insert(IngestStats).from_select(
+        ['data_quality', 'fact_count'],
+        select(WeatherFact.data_quality, func.count()).group_by(WeatherFact.data_quality)
+    ))
+    if conn.dialect.name == 'postgresql':
+        # Fresh planner statistics after a bulk load
+        conn.execute(text(f"ANALYZE {WeatherFact.__tablename__}"))
+
+def parse_weather_file(file_path):
+    """Parse and quality-score one station file into columns (no DB access, safe to run in a worker process).
+
+    Returns (station_id, columns): a dict of equal-length NumPy arrays keyed by fact column,
+    ready for concat_columns / fact_rows.
+    """
+    station_id = os.path.basename(file_path).replace('.txt', '')
+    # mmap the file and scan it as bytes: no copy into a Python buffer, no per-line decode
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        if os.fstat(fd).st_size == 0:
+            mm = None
+        else:
+            mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+    if mm is None:
+        parsed = parse_weather_lines([])
+    else:
+        with mm:
+            try:
+                parsed = parse_weather_buffer(mm)
+            except ValueError:
+                # Malformed lines trip the pandas parser: redo this file line by line,
+                # splitting one bytes copy of the map rather than calling readline per line
+                parsed = parse_weather_lines(line for line in mm[:].splitlines() if line.strip())
+    observation_dates, raw_max_temp, raw_min_temp, raw_precip = parsed
+    columns = {
+        'station_id': np.full(len(observation_dates), station_id, dtype=object),
+        'observation_date': observation_dates,
+        'raw_max_temp': raw_max_temp,
+        'raw_min_temp': raw_min_temp,
+        'raw_precip': raw_precip,
+    }
+    columns.update(score_weather_values(raw_max_temp, raw_min_temp, raw_precip))
+    return station_id, columns
+
+def parse_weather_files_in_pool(pool, file_paths, in_flight):
+    """Yield parse_weather_file results from `pool` as they finish, with at most `in_flight` files submitted.
+
+    A slow writer then holds back the workers instead of letting parsed column sets pile up.
+    """
+    file_paths = iter(file_paths)
+    pending = {pool.submit(parse_weather_file, path) for path in islice(file_paths, in_flight)}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+            # Submit the next file once a result has been taken; with in_flight above the
+            # worker count, the rest keep every worker busy while the caller writes
+            pending |= {pool.submit(parse_weather_file, path) for path in islice(file_paths, 1)}
+
+@ingest_logging()
+def ingest_weather_data(wx_data_dir='wx_data', source='manual', ingest_run_id=DEFAULT_INGEST_RUN_ID, workers=None):
+    """Idempotent ingestion of weather data into WeatherFact (composite PK, upsert).
+
+    Files are parsed in parallel by a pool of `workers` processes (default: one per CPU);
+    this process stays the single writer. The whole run is one transaction, committed at
+    the end, with a SAVEPOINT per batch (see write_checkpointed).
+    """
     start_time = datetime.now()
-    engine, SessionLocal = create_engine_and_session()
+    # One logical ingest timestamp for the whole run, shared by every row (datetimes are immutable)
+    ingested_at = datetime.utcnow()
+    engine, _ = create_engine_and_session()
     create_tables(engine)
-    session = SessionLocal()
+    # Core connection for the bulk writes: no ORM unit of work or identity map in the loop
+    conn = engine.connect()
     # Print detected SQL dialect
-    dialect = session.bind.dialect.name
+    dialect = engine.dialect.name
     logger.info(f"Detected SQL dialect: {dialect}")
     logger.info(f"Starting weather data ingestion at {start_time}")
     total_records = 0
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker_logging, initargs=(_log_queue,)
+    ) if workers > 1 else None
     try:
-        weather_files = [f for f in os.listdir(wx_data_dir) if f.endswith('.txt')]
-        for filename in weather_files:
-            station_id = filename.replace('.txt', '')
-            file_path = os.path.join(wx_data_dir, filename)
-            # Ensure station exists (minimal metadata for demo)
-            if not session.query(Station).filter_by(station_id=station_id).first():
-                session.add(Station(
-                    station_id=station_id,
-                    name=f"Station {station_id}",
-                    latitude=0.0, longitude=0.0, state='XX', active=True
-                ))
-                session.commit()
-            with open(file_path, 'r') as file:
-                for line in file:
-                    if line.strip():
-                        parsed = parse_weather_line(line)
-                        if parsed:
-                            # Calculate data quality metrics
-                            missing_values = sum(1 for value in [parsed['max_temp_c'], parsed['min_temp_c'], parsed['precip_mm']] if value is None)
-                            outlier_count = 0
-                            
-                            # Check for outliers (simplified logic)
-                            if parsed['max_temp_c'] is not None and (parsed['max_temp_c'] > 50 or parsed['max_temp_c'] < -50):
-                                outlier_count += 1
-                            if parsed['min_temp_c'] is not None and (parsed['min_temp_c'] > 40 or parsed['min_temp_c'] < -60):
-                                outlier_count += 1
-                            if parsed['precip_mm'] is not None and parsed['precip_mm'] > 1000:
-                                outlier_count += 1
-                            
-                            # Calculate quality score
-                            quality_score = max(0.0, 1.0 - (missing_values * 0.2) - (outlier_count * 0.1))
-                            
-                            # Check for logical inconsistencies
-                            if (parsed['max_temp_c'] is not None and parsed['min_temp_c'] is not None and 
-                                parsed['max_temp_c'] < parsed['min_temp_c']):
-                                quality_score -= 0.3
-                                quality_score = max(0.0, quality_score)
-                            
-                            # Determine data quality level
-                            if quality_score >= 0.9:
-                                data_quality = 'excellent'
-                            elif quality_score >= 0.7:
-                                data_quality = 'good'
-                            elif quality_score >= 0.5:
-                                data_quality = 'fair'
-                            else:
-                                data_quality = 'poor'
-                            
-                            fact_data = {
-                                'station_id': station_id,
-                                'observation_date': parsed['observation_date'],
-                                'source': source,
-                                'raw_max_temp': parsed['raw_max_temp'],
-                                'raw_min_temp': parsed['raw_min_temp'],
-                                'raw_precip': parsed['raw_precip'],
-                                'max_temp_c': parsed['max_temp_c'],
-                                'min_temp_c': parsed['min_temp_c'],
-                                'precip_mm': parsed['precip_mm'],
-                                'precip_cm': parsed['precip_cm'],
-                                'data_quality': data_quality,
-                                'quality_score': quality_score,
-                                'missing_values': missing_values,
-                                'outlier_count': outlier_count,
-                                'quality_notes': f"Missing: {missing_values}, Outliers: {outlier_count}",
-                                'ingested_at': datetime.utcnow(),
-                                'ingest_run_id': ingest_run_id
-                            }
-                            upsert_weather_fact(session, fact_data)
-                            total_records += 1
+        entries = list_weather_files(wx_data_dir)
+        # Ensure every station exists up front (minimal metadata for demo): one SELECT, one INSERT
+        missing = {entry.name[:-4] for entry in entries} - existing_station_ids(conn)
+        if missing:
+            conn.execute(insert(Station), [
+                {'station_id': station_id, 'name': f"Station {station_id}",
+                 'latitude': 0.0, 'longitude': 0.0, 'state': 'XX', 'active': True}
+                for station_id in sorted(missing)
+            ])
+        # An empty PostgreSQL table cannot conflict, so the first load streams in via COPY
+        first_load = dialect == 'postgresql' and conn.execute(
+            select(WeatherFact.station_id).limit(1)
+        ).first() is None
+        write_batch = copy_weather_fact if first_load else upsert_writer(dialect)
+        # Empty files have a station but no rows: don't ship them to a worker at all
+        weather_files = [entry.path for entry in entries if entry.stat().st_size > 0]
+        if pool:
+            # One task per file, about two per worker in flight; take results as workers finish them
+            parsed_files = parse_weather_files_in_pool(pool, weather_files, 2 * workers)
+        else:
+            parsed_files = map(parse_weather_file, weather_files)
+        # Parsed files wait here as columns; rows are only built for the batch being written
+        pending = None
+        for station_id, columns in parsed_files:
+            pending = columns if pending is None else concat_columns(pending, columns)
+            logger.debug(f"Parsed {len(columns['station_id'])} records for station {station_id}")
+            while len(pending['station_id']) >= BATCH_ROWS:
+                rows = fact_rows(slice_columns(pending, 0, BATCH_ROWS), source, ingest_run_id, ingested_at)
+                total_records += write_checkpointed(conn, write_batch, rows)
+                pending = slice_columns(pending, BATCH_ROWS)
+        if pending is not None:
+            rows = fact_rows(pending, source, ingest_run_id, ingested_at)
+            total_records += write_checkpointed(conn, write_batch, rows)
+        refresh_ingest_stats(conn)
+        conn.commit()
         logger.info(f"Weather data ingestion complete: {total_records} records")
     except Exception as e:
         logger.error(f"Error during ingestion: {e}")
-        session.rollback()
+        conn.rollback()
         raise
     finally:
-        session.close()
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        conn.close()
     return total_records
 
 
 
+@ingest_logging()
 def get_ingestion_summary():
     """Get a summary of ingested data."""
     engine, SessionLocal = create_engine_and_session()
@@ -268,25 +549,29 @@ def get_ingestion_summary():
     try:
         # Count records
         station_count = session.query(Station).count()
-        weather_count = session.query(WeatherFact).count()
         
-        # Get data quality distribution
-        quality_distribution = session.query(
-            WeatherFact.data_quality,
-            func.count(WeatherFact.station_id)
-        ).group_by(WeatherFact.data_quality).all()
+        # Data quality distribution from the rollup written by the last ingest run;
+        # count the fact table only if no run has written it yet
+        quality_distribution = session.query(IngestStats.data_quality, IngestStats.fact_count).all()
+        if not quality_distribution:
+            quality_distribution = session.query(
+                WeatherFact.data_quality,
+                func.count(WeatherFact.station_id)
+            ).group_by(WeatherFact.data_quality).all()
+        weather_count = sum(count for _, count in quality_distribution)
         
         logger.info("=== INGESTION SUMMARY ===")
         logger.info(f"Stations: {station_count}")
         logger.info(f"Weather Facts: {weather_count}")
         logger.info("Data Quality Distribution:")
-        for quality, count in quality_distribution:
+        quality_distribution = {QUALITY_NAMES[code]: count for code, count in quality_distribution}
+        for quality, count in quality_distribution.items():
             logger.info(f"  {quality}: {count}")
         
         return {
             'stations': station_count,
             'weather_facts': weather_count,
-            'quality_distribution': dict(quality_distribution)
+            'quality_distribution': quality_distribution
         }
         
     except Exception as e:
@@ -296,12 +581,13 @@ def get_ingestion_summary():
         session.close()
 
 if __name__ == "__main__":
-    # Ingest weather data
-    weather_records = ingest_weather_data()
-    
-    # Get summary
-    summary = get_ingestion_summary()
-    
-    logger.info(f"Ingestion complete: {weather_records} weather records")
-    if summary:
-        logger.info(f"Summary: {summary}") 
\ No newline at end of file
+    with ingest_logging():
+        # Ingest weather data
+        weather_records = ingest_weather_data()
+        
+        # Get summary
+        summary = get_ingestion_summary()
+        
+        logger.info(f"Ingestion complete: {weather_records} weather records")
+        if summary:
+            logger.info(f"Summary: {summary}") 
\ No newline at end of file
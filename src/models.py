@@ -1,9 +1,12 @@
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Date, SmallInteger, Float, DateTime, Boolean, Text, DECIMAL, Enum, ForeignKey, Index, CheckConstraint, Computed
+    create_engine, event, inspect, Column, Integer, String, Date, SmallInteger, Float, DateTime, Boolean, DECIMAL, ForeignKey, Index, CheckConstraint, Computed, text
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateIndex, CreateTable
 from datetime import datetime
+from functools import lru_cache
 import os
 
 Base = declarative_base()
@@ -12,6 +15,18 @@ Base = declarative_base()
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///weather_data.db')
 IS_POSTGRES = DATABASE_URL.startswith('postgresql')
 
+# data_quality is stored as a small integer code; QUALITY_NAMES[code] is the label shown by the API
+QUALITY_NAMES = ('poor', 'fair', 'good', 'excellent')
+QUALITY_CODES = {name: code for code, name in enumerate(QUALITY_NAMES)}
+
+# Generated-column expressions for the calendar keys (SQLite stores dates as ISO text)
+if IS_POSTGRES:
+    YEAR_SQL = 'CAST(EXTRACT(YEAR FROM observation_date) AS INTEGER)'
+    QUARTER_SQL = 'CAST(EXTRACT(QUARTER FROM observation_date) AS INTEGER)'
+else:
+    YEAR_SQL = 'CAST(substr(observation_date, 1, 4) AS INTEGER)'
+    QUARTER_SQL = '(CAST(substr(observation_date, 6, 2) AS INTEGER) + 2) / 3'
+
 class Station(Base):
     """Weather station dimension table with metadata and spatial info."""
     __tablename__ = 'stations'
@@ -57,20 +72,25 @@ class WeatherFact(Base):
     max_temp_c = Column(Float)           # deg C
     min_temp_c = Column(Float)
     precip_mm = Column(Float)
-    precip_cm = Column(Float)
+    # Derived on read in SQLite (VIRTUAL); PostgreSQL only has STORED generated columns
+    precip_cm = Column(Float, Computed('precip_mm / 10.0', persisted=IS_POSTGRES))
     # Add *_qc columns for QA'd values if needed
     
     # Data quality
-    data_quality = Column(Enum('excellent', 'good', 'fair', 'poor', name='quality_enum'), default='good', index=True)
+    data_quality = Column(SmallInteger, default=QUALITY_CODES['good'], index=True)  # code into QUALITY_NAMES
     quality_score = Column(DECIMAL(3,2), default=1.00, index=True)
     missing_values = Column(Integer, default=0)
     outlier_count = Column(Integer, default=0)
-    quality_notes = Column(Text)
+    # quality_notes is not stored: the API renders it from missing_values/outlier_count
     
     # Lineage
     ingested_at = Column(DateTime, default=datetime.utcnow, index=True)
     ingest_run_id = Column(String(36), nullable=True)  # UUID for batch lineage
 
+    # Generated calendar keys: stored once per row so aggregations group by plain columns
+    year = Column(Integer, Computed(YEAR_SQL, persisted=True))
+    quarter = Column(SmallInteger, Computed(QUARTER_SQL, persisted=True))
+
     # Relationships
     station = relationship("Station", back_populates="weather_facts")
     
@@ -80,15 +100,32 @@ class WeatherFact(Base):
         CheckConstraint('(raw_max_temp BETWEEN -9999 AND 6000 OR raw_max_temp IS NULL)', name='ck_raw_max_temp'),
         CheckConstraint('(raw_min_temp BETWEEN -9999 AND 6000 OR raw_min_temp IS NULL)', name='ck_raw_min_temp'),
         CheckConstraint('(raw_precip BETWEEN 0 AND 10000 OR raw_precip IS NULL)', name='ck_raw_precip'),
+        CheckConstraint(f'(data_quality BETWEEN 0 AND {len(QUALITY_NAMES) - 1} OR data_quality IS NULL)', name='ck_data_quality'),
         Index('idx_obs_date', 'observation_date', postgresql_using='brin'),  # BRIN for Postgres, normal for SQLite
-        Index('idx_station_date', 'station_id', 'observation_date'),
+        # Matches the API's (observation_date DESC, station_id, source) order: keyset pages are index seeks
+        Index('idx_fact_keyset', text('observation_date DESC'), 'station_id', 'source'),
+        # Orders the per-station (station, year[, quarter]) GROUP BYs in analyze.py so they need no
+        # sort. Not covering: SQLite does not read indexed generated columns from the index, so
+        # measure columns here would only add write cost to every upsert
+        Index('idx_station_year_quarter', 'station_id', 'year', 'quarter'),
         Index('idx_quality', 'data_quality'),
     )
     # For materialized views: see analyze.py for annual stats
 
     # Optionally, drop raw_* columns after QA to save storage
 
-# Only two main tables for simplicity: Station and WeatherFact
+class IngestStats(Base):
+    """Fact counts per data_quality, refreshed at the end of each ingest run.
+
+    Lets the ingestion summary read a handful of rows instead of counting weather_facts.
+    """
+    __tablename__ = 'ingest_stats'
+
+    data_quality = Column(SmallInteger, primary_key=True)  # code into QUALITY_NAMES
+    fact_count = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+
+# Two main tables for simplicity: Station and WeatherFact (plus the small IngestStats rollup)
 # All other analytics/aggregations can be materialized views or external tables
 
 # Database setup
@@ -96,13 +133,97 @@ class WeatherFact(Base):
 def get_database_url():
     return os.getenv('DATABASE_URL', 'sqlite:///weather_data.db')
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection: WAL journal, relaxed fsync, large page cache and mmap."""
+    cursor = dbapi_connection.cursor()
+    if os.getenv('BULK') == '1':
+        # Throwaway bulk loads: the database can be rebuilt from wx_data, so skip fsync and keep the
+        # rollback journal in memory (journal_mode=OFF would break ROLLBACK TO the per-batch SAVEPOINTs)
+        cursor.execute("PRAGMA journal_mode=MEMORY")
+        cursor.execute("PRAGMA synchronous=OFF")
+    else:
+        # WAL keeps API readers unblocked while ingestion writes
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-262144")  # 256 MiB
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+    # Stop pysqlite opening transactions on its own; _begin_sqlite_transaction emits BEGIN instead
+    dbapi_connection.isolation_level = None
+
+def _begin_sqlite_transaction(conn):
+    """Emit BEGIN when SQLAlchemy starts a transaction, so SAVEPOINTs nest inside it.
+
+    pysqlite only opens a transaction before DML; a SAVEPOINT issued first becomes the
+    outermost transaction and releasing it commits, which would leak nested writes.
+    """
+    conn.exec_driver_sql("BEGIN")
+
 def create_engine_and_session():
-    engine = create_engine(get_database_url())
+    """Shared (engine, sessionmaker) pair for DATABASE_URL, built once per process and URL."""
+    return _engine_and_session(get_database_url())
+
+@lru_cache(maxsize=1)
+def _engine_and_session(database_url):
+    connect_args = {}
+    # Room for every API filter combination plus the ingest statements (default 500)
+    engine_kwargs = {'query_cache_size': 1200}
+    if database_url.startswith('sqlite'):
+        # Larger per-connection prepared-statement cache than sqlite3's default of 128
+        connect_args['cached_statements'] = 256
+        if database_url in ('sqlite://', 'sqlite:///:memory:'):
+            # An in-memory database lives in one connection: share it across threads and sessions
+            connect_args['check_same_thread'] = False
+            engine_kwargs['poolclass'] = StaticPool
+    elif database_url.startswith('postgresql'):
+        # Send an ingest batch as one multi-row INSERT rather than pages of 1000
+        engine_kwargs['insertmanyvalues_page_size'] = 10_000
+    engine = create_engine(database_url, connect_args=connect_args, **engine_kwargs)
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+        event.listen(engine, 'begin', _begin_sqlite_transaction)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     return engine, SessionLocal
 
+def _reset_engine():
+    """Forget the shared engine so the next create_engine_and_session() builds a new pool."""
+    _engine_and_session.cache_clear()
+
+def check_schema(engine):
+    """Raise RuntimeError if weather_facts was created by an older version of this schema.
+
+    create_tables only adds what is missing, so an outdated table would otherwise fail later
+    with 'no such column' errors. Its rows can be re-derived from wx_data: see README.md,
+    "Upgrading an existing database".
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(WeatherFact.__tablename__):
+        return
+    columns = {column['name']: column['type'] for column in inspector.get_columns(WeatherFact.__tablename__)}
+    expected = set(WeatherFact.__table__.columns.keys())
+    # data_quality moved from enum strings to SMALLINT codes
+    if set(columns) != expected or not isinstance(columns['data_quality'], Integer):
+        raise RuntimeError(
+            f"Table {WeatherFact.__tablename__} predates the current schema "
+            f"(missing: {sorted(expected - set(columns))}, obsolete: {sorted(set(columns) - expected)}). "
+            f"Drop it and re-run ingestion to rebuild it from wx_data (README.md, 'Upgrading an existing database')."
+        )
+
 def create_tables(engine):
-    Base.metadata.create_all(bind=engine)
+    check_schema(engine)
+    if engine.dialect.name != 'sqlite':
+        Base.metadata.create_all(bind=engine)
+        return
+    # SQLite: send the whole (idempotent) schema as one script instead of a probe + CREATE per object
+    ddl = [CreateTable(table, if_not_exists=True) for table in Base.metadata.sorted_tables]
+    ddl += [CreateIndex(index, if_not_exists=True) for table in Base.metadata.sorted_tables for index in table.indexes]
+    script = ';\n'.join(str(statement.compile(dialect=engine.dialect)).strip() for statement in ddl) + ';'
+    raw = engine.raw_connection()
+    try:
+        raw.executescript(script)
+    finally:
+        raw.close()
 
 def get_db():
     engine, SessionLocal = create_engine_and_session()
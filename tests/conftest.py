@@ -0,0 +1,19 @@
+"""pytest setup for the API tests: import the app once while collecting.
+
+Building the Flask app and the SQLAlchemy metadata is the slowest part of importing
+test_api; doing it here keeps it out of the first test's timing. test_api.py sets the
+same environment itself so it still runs under plain unittest.
+"""
+
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# Must match test_api.py: the engine is built from these when app is first imported
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['BULK'] = '1'
+
+importlib.import_module('models')
+importlib.import_module('app')
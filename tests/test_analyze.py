@@ -0,0 +1,87 @@
+import unittest
+import os
+import sys
+from datetime import date
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+# Add src directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from analyze import (
+    all_weather_aggregations, annual_weather_aggregation, monthly_weather_aggregation,
+    quarterly_weather_aggregation,
+)
+from models import Station, WeatherFact, create_tables
+
+def fact(station_id, day, max_temp_c, min_temp_c, precip_mm, quality_score):
+    return {
+        'station_id': station_id, 'observation_date': day, 'source': 'manual',
+        'max_temp_c': max_temp_c, 'min_temp_c': min_temp_c, 'precip_mm': precip_mm,
+        'quality_score': quality_score,
+    }
+
+# Two stations over several months and two years; None marks a missing measure
+FACTS = [
+    fact('USC00000001', date(2020, 1, 1), 10.0, 1.0, 0.5, 1.0),
+    fact('USC00000001', date(2020, 1, 2), None, 2.0, None, 0.75),
+    fact('USC00000001', date(2020, 2, 10), 12.5, None, 3.0, 1.0),
+    fact('USC00000001', date(2020, 4, 1), None, None, None, 0.5),   # a month with no measures at all
+    fact('USC00000001', date(2020, 5, 20), 25.0, 14.0, 0.0, 1.0),
+    fact('USC00000001', date(2021, 12, 31), -3.0, -9.5, 7.25, 0.9),
+    fact('USC00000002', date(2020, 1, 15), 4.0, -2.0, None, None),
+    fact('USC00000002', date(2020, 3, 3), 8.0, 0.5, 1.5, 0.8),
+]
+
+MEASURES = ('avg_max_temp_c', 'avg_min_temp_c', 'total_precip_mm', 'record_count', 'avg_quality_score')
+
+class TestAllWeatherAggregations(unittest.TestCase):
+    """The single-scan rollup must match the per-period queries it replaced."""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = create_engine('sqlite://')
+        create_tables(cls.engine)
+        with cls.engine.begin() as conn:
+            conn.execute(insert(Station), [
+                {'station_id': station_id, 'name': station_id, 'latitude': 0.0, 'longitude': 0.0, 'state': 'XX'}
+                for station_id in ('USC00000001', 'USC00000002')
+            ])
+            conn.execute(insert(WeatherFact), FACTS)
+    
+    def setUp(self):
+        self.session = Session(self.engine)
+        self.addCleanup(self.session.close)
+    
+    def by_key(self, rows, period):
+        """{(station_id, year, period): measures}, with numbers as floats so Decimal averages compare."""
+        return {
+            (row.station_id, row.year, getattr(row, period) if period else None):
+                tuple(None if getattr(row, m) is None else float(getattr(row, m)) for m in MEASURES)
+            for row in rows
+        }
+    
+    def test_periods_match_separate_queries(self):
+        combined = {}
+        for row in all_weather_aggregations(self.session):
+            combined.setdefault(row.period_type, []).append(row)
+        cases = [
+            ('annual', annual_weather_aggregation, None),
+            ('quarterly', quarterly_weather_aggregation, 'quarter'),
+            ('monthly', monthly_weather_aggregation, 'month'),
+        ]
+        for period_type, separate, period in cases:
+            with self.subTest(period_type=period_type):
+                expected = self.by_key(separate(self.session), period)
+                actual = self.by_key(combined[period_type], 'period' if period else None)
+                self.assertEqual(actual.keys(), expected.keys())
+                for key, values in expected.items():
+                    for measure, got, want in zip(MEASURES, actual[key], values):
+                        if want is None:
+                            self.assertIsNone(got, (key, measure))
+                        else:
+                            self.assertAlmostEqual(got, want, places=9, msg=(key, measure))
+
+if __name__ == '__main__':
+    unittest.main()
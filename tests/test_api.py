@@ -1,202 +1,298 @@
 import unittest
-import json
 import os
 import sys
+import time
+from unittest.mock import patch
 from datetime import date
 
 # Add src directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from models import create_engine_and_session, create_tables, Station, WeatherFact
-from app import app
+# Use in-memory SQLite for testing; must be set before app creates its engine
+os.environ['DATABASE_URL'] = 'sqlite://'
+# Throwaway database: in bulk mode the engine's connect hook skips fsync and journals in memory
+os.environ['BULK'] = '1'
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from models import create_engine_and_session, create_tables, Station, WeatherFact, QUALITY_CODES
+import app as app_module
+from app import app, ENGINE, count_stations
 
 class TestWeatherWarehouseAPI(unittest.TestCase):
     """Test cases for the weather data API with optimal data model."""
     
-    def setUp(self):
-        """Set up test database and sample data."""
-        # Remove the test database file before each test run
-        try:
-            os.remove('test.db')
-        except FileNotFoundError:
-            pass
-        # Use file-based SQLite for testing
-        os.environ['DATABASE_URL'] = 'sqlite:///test.db'
-        
-        # Create tables
-        self.engine, self.SessionLocal = create_engine_and_session()
-        create_tables(self.engine)
+    # Sample stations
+    STATIONS = [
+        {'station_id': 'TEST001', 'name': 'Test Station', 'latitude': 40.0, 'longitude': -75.0,
+         'elevation': 100.0, 'state': 'PA', 'country': 'USA', 'timezone': 'UTC', 'active': True},
+    ]
+    
+    # Sample weather facts
+    FACTS = [
+        {'station_id': 'TEST001', 'observation_date': date(2020, 1, 1), 'source': 'manual',
+         'raw_max_temp': 100, 'raw_min_temp': 10, 'raw_precip': 5,
+         'max_temp_c': 10.0, 'min_temp_c': 1.0, 'precip_mm': 0.5,
+         'data_quality': QUALITY_CODES['excellent'], 'quality_score': 1.0,
+         'missing_values': 0, 'outlier_count': 0, 'ingest_run_id': 'run-1'},
+        {'station_id': 'TEST001', 'observation_date': date(2020, 1, 2), 'source': 'manual',
+         'raw_max_temp': 120, 'raw_min_temp': 20, 'raw_precip': 10,
+         'max_temp_c': 12.0, 'min_temp_c': 2.0, 'precip_mm': 1.0,
+         'data_quality': QUALITY_CODES['good'], 'quality_score': 0.9,
+         'missing_values': 0, 'outlier_count': 0, 'ingest_run_id': 'run-1'},
+    ]
+    
+    @classmethod
+    def setUpClass(cls):
+        """Create the schema and sample data once for the whole class."""
+        # Closing the single pooled connection discards any previous in-memory database
+        ENGINE.dispose()
+        cls.engine, cls.SessionLocal = create_engine_and_session()
+        create_tables(cls.engine)
+        cls.create_sample_data()
         
-        # Create test app
+        # One test client for the class; each test still gets its own app context
         app.config['TESTING'] = True
-        self.app = app.test_client()
-        
-        # Create sample data
-        self.create_sample_data()
+        cls.client = app.test_client()
+    
+    def setUp(self):
+        """Run each test inside an outer transaction that tearDown rolls back."""
+        self.connection = self.engine.connect()
+        self.trans = self.connection.begin()
+        # App and test sessions join that transaction; their commits only release savepoints
+        self.SessionLocal = sessionmaker(bind=self.connection, join_transaction_mode='create_savepoint')
+        self._app_sessions = app_module.SessionLocal
+        app_module.SessionLocal = self.SessionLocal
+        count_stations.cache_clear()
+        self._ctx = app.app_context()
+        self._ctx.push()
     
-    def create_sample_data(self):
+    def tearDown(self):
+        self._ctx.pop()
+        app_module.SessionLocal = self._app_sessions
+        self.trans.rollback()
+        self.connection.close()
+    
+    @classmethod
+    def create_sample_data(cls):
         """Create sample data for testing."""
-        session = self.SessionLocal()
-        
-        try:
-            # Create sample stations
-            station = Station(
-                station_id='TEST001',
-                name='Test Station',
-                latitude=40.0,
-                longitude=-75.0,
-                elevation=100.0,
-                state='PA',
-                country='USA',
-                timezone='UTC',
-                active=True
-            )
-            
-            session.add(station)
-            
-            # Create sample weather facts
-            fact1 = WeatherFact(
-                station_id='TEST001',
-                observation_date=date(2020, 1, 1),
-                source='manual',
-                raw_max_temp=100,
-                raw_min_temp=10,
-                raw_precip=5,
-                max_temp_c=10.0,
-                min_temp_c=1.0,
-                precip_mm=0.5,
-                precip_cm=0.05,
-                data_quality='excellent',
-                quality_score=1.0,
-                missing_values=0,
-                outlier_count=0,
-                quality_notes='All good',
-                ingest_run_id='run-1'
-            )
-            fact2 = WeatherFact(
-                station_id='TEST001',
-                observation_date=date(2020, 1, 2),
-                source='manual',
-                raw_max_temp=120,
-                raw_min_temp=20,
-                raw_precip=10,
-                max_temp_c=12.0,
-                min_temp_c=2.0,
-                precip_mm=1.0,
-                precip_cm=0.1,
-                data_quality='good',
-                quality_score=0.9,
-                missing_values=0,
-                outlier_count=0,
-                quality_notes='Good',
-                ingest_run_id='run-1'
-            )
-            
-            session.add(fact1)
-            session.add(fact2)
-            
-            session.commit()
-            
-        finally:
-            session.close()
+        # Plain row dicts through Core inserts: no ORM instrumentation or unit of work
+        with cls.engine.begin() as conn:
+            conn.execute(insert(Station), cls.STATIONS)
+            conn.execute(insert(WeatherFact), cls.FACTS)
+    
+    @classmethod
+    def _bulk_seed(cls, connection, n):
+        """Insert n generated daily facts for TEST001 from 2021-01-01 in one executemany."""
+        rng = np.random.default_rng(0)
+        dates = np.datetime64('2021-01-01') + np.arange(n)
+        raw_max = rng.integers(0, 400, n)
+        raw_min = raw_max - rng.integers(0, 150, n)
+        raw_precip = rng.integers(0, 300, n)
+        rows = list(zip(
+            ['TEST001'] * n, dates.astype(str).tolist(), ['manual'] * n,
+            raw_max.tolist(), raw_min.tolist(), raw_precip.tolist(),
+            (raw_max / 10).tolist(), (raw_min / 10).tolist(), (raw_precip / 10).tolist(),
+            [QUALITY_CODES['excellent']] * n, [1.0] * n, [0] * n, [0] * n, ['bulk-run'] * n,
+        ))
+        connection.exec_driver_sql(
+            "INSERT INTO weather_facts (station_id, observation_date, source, raw_max_temp, raw_min_temp, "
+            "raw_precip, max_temp_c, min_temp_c, precip_mm, data_quality, quality_score, missing_values, "
+            "outlier_count, ingest_run_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
     
     def test_health_check(self):
         """Test health check endpoint."""
-        response = self.app.get('/api/health')
+        response = self.client.get('/api/health')
         self.assertEqual(response.status_code, 200)
-        data = json.loads(response.data)
+        data = response.get_json()
         self.assertIn('status', data)
         self.assertEqual(data['status'], 'healthy')
     
     def test_station_list(self):
         """Test stations endpoint."""
-        response = self.app.get('/api/stations/')
+        response = self.client.get('/api/stations/')
         self.assertEqual(response.status_code, 200)
-        data = json.loads(response.data)
+        data = response.get_json()
         
         self.assertIn('data', data)
         self.assertEqual(len(data['data']), 1)
         self.assertEqual(data['data'][0]['station_id'], 'TEST001')
     
+    def test_station_count_expires(self):
+        """A cached station total is refreshed once its TTL bucket has passed."""
+        def total_at(now):
+            with patch('app.time.monotonic', return_value=now):
+                return self.client.get('/api/stations/').get_json()['pagination']['total']
+        
+        now = time.monotonic()
+        self.assertEqual(total_at(now), 1)
+        self.connection.execute(insert(Station), [{
+            'station_id': 'TEST002', 'name': 'Second Station', 'latitude': 41.0, 'longitude': -76.0,
+            'elevation': 50.0, 'state': 'PA',
+        }])
+        # Same bucket: the cached total is still served
+        self.assertEqual(total_at(now), 1)
+        self.assertEqual(total_at(now + app_module.STATION_COUNT_TTL), 2)
+    
     def test_weather_fact_list(self):
         """Test weather records endpoint."""
-        response = self.app.get('/api/weather/')
+        response = self.client.get('/api/weather/')
         self.assertEqual(response.status_code, 200)
-        data = json.loads(response.data)
-        
-        self.assertIn('data', data)
-        self.assertEqual(len(data['data']), 2)
         
-        # Check raw and clean columns
-        for fact in data['data']:
-            self.assertIn('raw_max_temp', fact)
-            self.assertIn('max_temp_c', fact)
-            self.assertIn('year', fact)  # generated column
+        # Check raw and clean columns on both records by scanning the body, no JSON parse needed
+        # (the other tests decode the full response shape)
+        self.assertEqual(response.data.count(b'"raw_max_temp"'), 2)
+        self.assertEqual(response.data.count(b'"max_temp_c"'), 2)
+        self.assertEqual(response.data.count(b'"year"'), 2)  # generated column
+    
+    def test_weather_years(self):
+        """Test distinct years endpoint."""
+        response = self.client.get('/api/weather/years')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['years'], [2020])
     
     def test_weather_fact_filtering(self):
         """Test weather filtering."""
-        # By station
-        response = self.app.get('/api/weather/?station_id=TEST001')
-        self.assertEqual(response.status_code, 200)
-        data = json.loads(response.data)
-        self.assertEqual(len(data['data']), 2)
-        
-        # By date
-        response = self.app.get('/api/weather/?start_date=2020-01-02')
-        data = json.loads(response.data)
-        self.assertEqual(len(data['data']), 1)
-        
-        # By data_quality
-        response = self.app.get('/api/weather/?data_quality=excellent')
-        data = json.loads(response.data)
-        self.assertEqual(len(data['data']), 1)
+        cases = [
+            ('station_id=TEST001', 2),      # By station
+            ('start_date=2020-01-02', 1),   # By date
+            ('data_quality=excellent', 1),  # By data_quality
+        ]
+        for query, expected in cases:
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/weather/?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.get_json()['data']), expected)
     
     def test_pagination(self):
         """Test pagination functionality."""
         # Test with page parameter
-        response = self.app.get('/api/weather/?page=1&per_page=1')
+        response = self.client.get('/api/weather/?page=1&per_page=1')
         self.assertEqual(response.status_code, 200)
-        data = json.loads(response.data)
+        data = response.get_json()
         
         self.assertEqual(len(data['data']), 1)
         self.assertEqual(data['pagination']['page'], 1)
         self.assertEqual(data['pagination']['per_page'], 1)
         self.assertTrue(data['pagination']['has_next'])
     
+    def test_per_page_is_clamped(self):
+        """per_page below 1 is treated as 1 instead of breaking the response."""
+        for per_page in (0, -5):
+            with self.subTest(per_page=per_page):
+                response = self.client.get(f'/api/weather/?per_page={per_page}')
+                self.assertEqual(response.status_code, 200)
+                data = response.get_json()
+                self.assertEqual(len(data['data']), 1)
+                self.assertEqual(data['pagination']['per_page'], 1)
+                self.assertEqual(data['pagination']['next_after_date'], '2020-01-02')
+                
+                response = self.client.get(f'/api/stations/?per_page={per_page}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get_json()['pagination']['per_page'], 1)
+    
+    def test_keyset_pagination(self):
+        """Test cursor (keyset) pagination on weather records."""
+        response = self.client.get('/api/weather/?per_page=1')
+        data = response.get_json()
+        pagination = data['pagination']
+        self.assertEqual(data['data'][0]['observation_date'], '2020-01-02')
+        self.assertTrue(pagination['has_next'])
+        
+        # Follow the cursor to the second (last) page
+        response = self.client.get(
+            f"/api/weather/?per_page=1&after_date={pagination['next_after_date']}"
+            f"&after_station={pagination['next_after_station']}"
+            f"&after_source={pagination['next_after_source']}"
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(len(data['data']), 1)
+        self.assertEqual(data['data'][0]['observation_date'], '2020-01-01')
+        self.assertFalse(data['pagination']['has_next'])
+        self.assertTrue(data['pagination']['has_prev'])
+        
+        # A partial cursor is rejected rather than silently ignored
+        for query in ('after_date=2020-01-02', 'after_station=TEST001', 'after_source=manual',
+                      'after_date=2020-01-02&after_source=manual'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/weather/?{query}').status_code, 400)
+        
+        # Without after_source the cursor is past every source of that station on that date
+        self.connection.execute(insert(WeatherFact), [{
+            **self.FACTS[1], 'source': 'station', 'ingest_run_id': 'run-2',
+        }])
+        data = self.client.get(
+            '/api/weather/?after_date=2020-01-02&after_station=TEST001'
+        ).get_json()
+        self.assertEqual([fact['observation_date'] for fact in data['data']], ['2020-01-01'])
+    
+    def test_keyset_pagination_bulk(self):
+        """Walk a 1000-row dataset with the keyset cursor."""
+        self._bulk_seed(self.connection, 1000)
+        keys = []
+        url = '/api/weather/?station_id=TEST001&per_page=250'
+        while True:
+            data = self.client.get(url).get_json()
+            keys += [(fact['observation_date'], fact['station_id'], fact['source']) for fact in data['data']]
+            pagination = data['pagination']
+            if not pagination['has_next']:
+                break
+            url = (
+                f"/api/weather/?station_id=TEST001&per_page=250&after_date={pagination['next_after_date']}"
+                f"&after_station={pagination['next_after_station']}"
+                f"&after_source={pagination['next_after_source']}"
+            )
+        # Every row exactly once, in the API order (observation_date DESC, station_id, source)
+        self.assertEqual(len(keys), 1002)
+        self.assertEqual(len(set(keys)), 1002)
+        expected = sorted(keys, key=lambda key: key[1:])
+        expected.sort(key=lambda key: key[0], reverse=True)
+        self.assertEqual(keys, expected)
+    
+    def test_weather_fact_query_error(self):
+        """A failing page query is a 500, not a truncated 200 body."""
+        # DDL is transactional in SQLite, so tearDown's rollback restores the table
+        self.connection.exec_driver_sql('DROP TABLE weather_facts')
+        with patch.dict(app.config, {'PROPAGATE_EXCEPTIONS': False}):
+            response = self.client.get('/api/weather/')
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('message', response.get_json())
+    
+    def test_keyset_query_plan(self):
+        """The keyset cursor queries seek idx_fact_keyset and need no sort."""
+        for cursor in ('after_date', 'after_station'):
+            with self.subTest(cursor=cursor):
+                stmt = app_module.cached_statement('facts', (cursor,)).compile(dialect=self.engine.dialect)
+                params = stmt.construct_params({
+                    'after_date': '2020-01-02', 'after_station': 'TEST001', 'after_source': 'manual',
+                    'offset': 0, 'limit': 1,
+                })
+                plan = ' '.join(row[-1] for row in self.connection.exec_driver_sql(
+                    f'EXPLAIN QUERY PLAN {stmt}', tuple(params[name] for name in stmt.positiontup)
+                ))
+                self.assertIn('SEARCH weather_facts USING INDEX idx_fact_keyset', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+    
     def test_check_constraints(self):
         """Test check constraints."""
-        # Try to insert out-of-bounds raw value
-        session = self.SessionLocal()
-        with self.assertRaises(Exception):
-            session.add(WeatherFact(
-                station_id='TEST001',
-                observation_date=date(2020, 1, 3),
-                source='manual',
-                raw_max_temp=99999,  # out of bounds
-                raw_min_temp=10,
-                raw_precip=5,
-                max_temp_c=10.0,
-                min_temp_c=1.0,
-                precip_mm=0.5,
-                precip_cm=0.05,
-                data_quality='excellent',
-                quality_score=1.0,
-                missing_values=0,
-                outlier_count=0,
-                quality_notes='All good',
-                ingest_run_id='run-1'
-            ))
-            session.commit()
-        session.close()
-
-    @classmethod
-    def tearDownClass(cls):
-        # Remove the test database file after all tests
-        import os
-        try:
-            os.remove('test.db')
-        except FileNotFoundError:
-            pass
+        # Try to insert out-of-bounds raw value; a SAVEPOINT keeps the test transaction usable
+        with self.assertRaises(IntegrityError), self.connection.begin_nested():
+            self.connection.execute(insert(WeatherFact), {
+                'station_id': 'TEST001',
+                'observation_date': date(2020, 1, 3),
+                'source': 'manual',
+                'raw_max_temp': 99999,  # out of bounds
+                'raw_min_temp': 10,
+                'raw_precip': 5,
+                'data_quality': QUALITY_CODES['excellent'],
+                'ingest_run_id': 'run-1',
+            })
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
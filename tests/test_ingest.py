@@ -0,0 +1,210 @@
+import unittest
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+from sqlalchemy import create_engine
+
+# Add src directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from fast_parse import MISSING, decode_dates
+from ingest import (
+    get_ingestion_summary, ingest_weather_data, parse_weather_file, parse_weather_files_in_pool,
+    parse_weather_lines, score_weather_values,
+)
+from models import QUALITY_CODES, QUALITY_NAMES, _reset_engine, check_schema, create_engine_and_session, create_tables
+
+CLEAN = (
+    b"20200101\t100\t-50\t0\n"
+    b"20200102\t-9999\t-9999\t-9999\n"
+    b"20200229\t355\t122\t2540\n"
+)
+
+EDGE = (
+    b"20200101\t100\t-50\t0\n"
+    b"20200102\t+120\t-9999\t15\r\n"
+    b"20200103\t 130 \t-20\t3 \n"
+    b"\n"
+    b"xx\t1\t2\t3\n"          # non-numeric field
+    b"20200105\t\t2\t3\n"     # blank field
+    b"20200106\t1\t2\n"       # three fields
+    b"20201301\t1\t2\t3\n"    # impossible date
+    b"20200107\t1\t2\t3"      # no trailing newline
+)
+
+class TestWeatherParsing(unittest.TestCase):
+    """The compiled, pandas and line-by-line parsers must give the same columns."""
+    
+    def parse_file(self, buf, have_numba):
+        """parse_weather_file on `buf` with the compiled parser switched on or off."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'USC00000001.txt')
+            with open(path, 'wb') as f:
+                f.write(buf)
+            with patch('ingest.HAVE_NUMBA', have_numba):
+                return parse_weather_file(path)[1]
+    
+    def assert_tiers_agree(self, buf):
+        lines = parse_weather_lines(line for line in buf.splitlines() if line.strip())
+        for have_numba in (True, False):
+            with self.subTest(have_numba=have_numba):
+                columns = self.parse_file(buf, have_numba)
+                for name, expected in zip(('observation_date', 'raw_max_temp', 'raw_min_temp', 'raw_precip'), lines):
+                    np.testing.assert_array_equal(columns[name], expected)
+        return lines
+    
+    def test_clean_buffer(self):
+        dates, max_temp, min_temp, precip = self.assert_tiers_agree(CLEAN)
+        np.testing.assert_array_equal(dates, np.array(['2020-01-01', '2020-01-02', '2020-02-29'], dtype='datetime64[D]'))
+        np.testing.assert_array_equal(max_temp, [100, MISSING, 355])
+        np.testing.assert_array_equal(precip, [0, MISSING, 2540])
+    
+    def test_edge_case_buffer(self):
+        dates, max_temp, min_temp, precip = self.assert_tiers_agree(EDGE)
+        np.testing.assert_array_equal(
+            dates, np.array(['2020-01-01', '2020-01-02', '2020-01-03', '2020-01-07'], dtype='datetime64[D]')
+        )
+        np.testing.assert_array_equal(max_temp, [100, 120, 130, 1])
+    
+    def test_rejected_lines_are_logged(self):
+        with self.assertLogs('ingest', level='WARNING') as logs:
+            self.parse_file(EDGE, have_numba=True)
+        messages = '\n'.join(logs.output)
+        for line in ('xx\t1\t2\t3', '20200105\t\t2\t3', '20200106\t1\t2', '20201301'):
+            self.assertIn(line, messages)
+        self.assertEqual(len(logs.output), 4)
+
+class TestDecodeDates(unittest.TestCase):
+    def test_valid_and_impossible_dates(self):
+        days, valid = decode_dates(np.array([19850101, 20200229, 20190229, 20201301, 20200100, 20201231]))
+        self.assertEqual(valid.tolist(), [True, True, False, False, False, True])
+        np.testing.assert_array_equal(
+            days[valid], np.array(['1985-01-01', '2020-02-29', '2020-12-31'], dtype='datetime64[D]')
+        )
+
+class TestScoreWeatherValues(unittest.TestCase):
+    def test_scores_and_codes(self):
+        scores = score_weather_values(
+            np.array([100, MISSING, 600, 10, MISSING], dtype=np.int16),    # max temp (tenths)
+            np.array([-50, 20, 0, 50, MISSING], dtype=np.int16),           # min temp
+            np.array([0, 5, 0, 0, MISSING], dtype=np.int16),               # precip
+        )
+        np.testing.assert_array_equal(scores['missing_values'], [0, 1, 0, 0, 3])
+        np.testing.assert_array_equal(scores['outlier_count'], [0, 0, 1, 0, 0])
+        # clean, one missing, one outlier, max below min, all missing
+        np.testing.assert_allclose(scores['quality_score'], [1.0, 0.8, 0.9, 0.7, 0.4])
+        expected = ['excellent', 'good', 'excellent', 'good', 'poor']
+        np.testing.assert_array_equal(scores['data_quality'], [QUALITY_CODES[name] for name in expected])
+
+class CountingPool(ThreadPoolExecutor):
+    """Thread pool that counts submitted tasks."""
+    
+    submitted = 0
+    
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+class TestParseInPool(unittest.TestCase):
+    def test_in_flight_is_bounded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(7):
+                paths.append(os.path.join(tmp, f'USC0000000{i}.txt'))
+                with open(paths[-1], 'wb') as f:
+                    f.write(CLEAN)
+            with CountingPool(max_workers=2) as pool:
+                station_ids = []
+                for station_id, columns in parse_weather_files_in_pool(pool, paths, 3):
+                    station_ids.append(station_id)
+                    # Submitted but not yet handed back: never more than in_flight
+                    self.assertLessEqual(pool.submitted - len(station_ids), 3)
+        self.assertEqual(sorted(station_ids), [f'USC0000000{i}' for i in range(7)])
+
+class TestIngestWeatherData(unittest.TestCase):
+    """End to end: wx_data files into a fresh SQLite database, run twice."""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.wx_dir = os.path.join(tmp.name, 'wx_data')
+        os.mkdir(self.wx_dir)
+        with open(os.path.join(self.wx_dir, 'USC00000001.txt'), 'wb') as f:
+            f.write(
+                b"20200101\t100\t-50\t0\n"
+                b"20200102\t120\t-20\t20000\n"  # breaks ck_raw_precip
+                b"20200103\t-9999\t-9999\t-9999\n"
+            )
+        open(os.path.join(self.wx_dir, 'USC00000002.txt'), 'wb').close()  # station with no rows
+        # Own file database and engine; the next create_engine_and_session() builds a fresh one again
+        env = patch.dict(os.environ, {'DATABASE_URL': f"sqlite:///{os.path.join(tmp.name, 'wx.db')}"})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(_reset_engine)
+        _reset_engine()
+        log_path = patch('ingest.LOG_PATH', os.path.join(tmp.name, 'ingestion.log'))
+        log_path.start()
+        self.addCleanup(log_path.stop)
+        self.engine = create_engine_and_session()[0]
+        self.addCleanup(self.engine.dispose)
+    
+    def test_bad_row_is_skipped_and_rerun_is_idempotent(self):
+        # The rerun parses in a process pool
+        for run, workers in ((1, 1), (2, 2)):
+            with self.subTest(run=run):
+                with self.assertLogs('ingest', level='WARNING') as logs:
+                    written = ingest_weather_data(self.wx_dir, workers=workers)
+                self.assertEqual(written, 2)
+                messages = '\n'.join(logs.output)
+                self.assertIn('Batch of 3 rows rejected', messages)
+                self.assertIn('Skipping row USC00000001 2020-01-02', messages)
+                self.assertIn('ck_raw_precip', messages)
+                with self.engine.connect() as conn:
+                    rows = conn.exec_driver_sql(
+                        "SELECT station_id, observation_date, raw_max_temp, raw_precip "
+                        "FROM weather_facts ORDER BY observation_date"
+                    ).all()
+                    stations = conn.exec_driver_sql("SELECT station_id FROM stations ORDER BY station_id").all()
+                self.assertEqual([tuple(row) for row in rows], [
+                    ('USC00000001', '2020-01-01', 100, 0),
+                    ('USC00000001', '2020-01-03', None, None),
+                ])
+                self.assertEqual([row[0] for row in stations], ['USC00000001', 'USC00000002'])
+    
+    def test_summary_matches_fact_table(self):
+        """The IngestStats rollup is recounted after a rerun, not added to."""
+        with self.assertLogs('ingest', level='WARNING'):
+            ingest_weather_data(self.wx_dir, workers=1)
+            ingest_weather_data(self.wx_dir, workers=1)
+        summary = get_ingestion_summary()
+        with self.engine.connect() as conn:
+            live = conn.exec_driver_sql(
+                "SELECT data_quality, COUNT(*) FROM weather_facts GROUP BY data_quality"
+            ).all()
+        self.assertEqual(summary['quality_distribution'], {QUALITY_NAMES[code]: count for code, count in live})
+        self.assertEqual(summary['weather_facts'], 2)
+        self.assertEqual(summary['stations'], 2)
+
+class TestCheckSchema(unittest.TestCase):
+    def test_current_schema_passes(self):
+        engine = create_engine('sqlite://')
+        create_tables(engine)
+        check_schema(engine)
+    
+    def test_outdated_table_is_rejected(self):
+        engine = create_engine('sqlite://')
+        with engine.begin() as conn:
+            # weather_facts as created before data_quality codes and the generated columns
+            conn.exec_driver_sql(
+                "CREATE TABLE weather_facts (station_id VARCHAR(20), observation_date DATE, source VARCHAR(50), "
+                "data_quality VARCHAR(9), quality_notes TEXT, PRIMARY KEY (station_id, observation_date, source))"
+            )
+        with self.assertRaisesRegex(RuntimeError, 'quality_notes'):
+            create_tables(engine)
+
+if __name__ == '__main__':
+    unittest.main()